@@ -0,0 +1 @@
+# bench/ — performance scripts for db.py (run with `python -m bench.<module>`)
@@ -0,0 +1,67 @@
+# bench/conn_overhead.py — per-call overhead of the db connection layer
+#
+#   python -m bench.conn_overhead [--calls 2000] [--rows 1000]
+#
+# "before" replays what every db.py call used to do (connect + schema probe + commit +
+# close, then a second connect for the query); "after" is the current db.py path with a
+# reused WAL connection and a once-per-process schema check.
+import argparse, sqlite3, tempfile, time
+from pathlib import Path
+
+import db
+
+def legacy_call(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+    cols_sql = ", ".join([f"{k} TEXT" for k, _ in db.COLUMNS])
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {db.TABLE} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_sql}, "
+                f"created_at TEXT DEFAULT (datetime('now')), updated_at TEXT)")
+    cur.execute(f"PRAGMA table_info({db.TABLE})")
+    cur.fetchall()
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    conn.close()
+    return rows
+
+def timed(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=2000)
+    ap.add_argument("--rows", type=int, default=1000)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp())
+    db.DB_PATH = tmp / "bench.sqlite3"
+    db.SEGMENTS_PATH = tmp / "segments.json"
+    db.upsert_many([{"full_name": f"Contact {i}", "phone_number": f"08{i:08d}"} for i in range(args.rows)])
+    path = str(db.DB_PATH)
+
+    cases = [
+        ("list_contacts(limit=1)",
+         lambda: legacy_call(path, f"SELECT * FROM {db.TABLE} ORDER BY id DESC LIMIT 1"),
+         lambda: db.list_contacts(limit=1)),
+        ("count_contacts()",
+         lambda: legacy_call(path, f"SELECT COUNT(*) FROM {db.TABLE}"),
+         lambda: db.count_contacts()),
+        ("unique_values('city')",
+         lambda: legacy_call(path, f"SELECT DISTINCT city AS v FROM {db.TABLE} WHERE city IS NOT NULL AND city <> '' ORDER BY 1"),
+         lambda: db.unique_values("city")),
+    ]
+    print(f"{'call':<26}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        b = timed(before, args.calls)
+        a = timed(after, args.calls)
+        print(f"{name:<26}{b:>12.1f}{a:>12.1f}{b / a:>9.1f}x")
+    db.close_all()
+
+if __name__ == "__main__":
+    main()
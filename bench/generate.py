@@ -0,0 +1,153 @@
+# bench/generate.py — seeded synthetic contacts at realistic scale
+#
+#   python -m bench.generate --rows 100000 --csv contacts_100k.csv [--seed 42]
+#
+# Distributions are skewed on purpose (most contacts in a few SA provinces/cities, a
+# long tail of tags), sponsors form trees (sponsors are earlier contacts, popular
+# sponsors attract more recruits) and phones/dates come in the mixed formats that real
+# sponsor exports contain.
+import argparse, csv, random
+from datetime import date, timedelta
+
+from db import COLUMNS
+
+KEYS = [k for k,_ in COLUMNS]
+
+# country -> weight, {province: (weight, [cities])}
+GEO = {
+    "South Africa": (80, {
+        "Gauteng": (40, ["Johannesburg", "Soweto", "Pretoria", "Midrand", "Benoni", "Tembisa"]),
+        "KwaZulu-Natal": (20, ["Durban", "Pietermaritzburg", "Umlazi", "Richards Bay"]),
+        "Western Cape": (15, ["Cape Town", "Khayelitsha", "Stellenbosch", "George"]),
+        "Eastern Cape": (10, ["Gqeberha", "East London", "Mthatha"]),
+        "Limpopo": (8, ["Polokwane", "Thohoyandou"]),
+        "Mpumalanga": (7, ["Mbombela", "Emalahleni"]),
+    }),
+    "Botswana": (8, {"South-East": (1, ["Gaborone"]), "Central": (1, ["Serowe", "Palapye"])}),
+    "Namibia": (5, {"Khomas": (1, ["Windhoek"])}),
+    "Zimbabwe": (4, {"Harare": (1, ["Harare"]), "Bulawayo": (1, ["Bulawayo"])}),
+    "Lesotho": (3, {"Maseru": (1, ["Maseru"])}),
+}
+FIRST = ["Thabo", "Sipho", "Lerato", "Nomsa", "Bongani", "Zanele", "Kagiso", "Palesa", "Themba", "Naledi",
+         "Mpho", "Ayanda", "Lindiwe", "Tshepo", "Karabo", "Refilwe", "John", "Sarah", "Pieter", "Anele"]
+LAST = ["Mokoena", "Dlamini", "Nkosi", "Ndlovu", "Khumalo", "Mahlangu", "Molefe", "Mthembu", "Botha",
+        "van der Merwe", "Naidoo", "Pillay", "Sithole", "Zulu", "Mabaso", "Masilela"]
+TAGS = ["vip", "follow-up", "webinar", "whatsapp", "referral", "event-2024", "event-2025", "price-sensitive",
+        "reseller", "health", "stem-cells", "needs-call", "spanish", "cold-list", "facebook", "tiktok"]
+AGENTS = ["Vanto", "Ayanda", "Sipho", "Lerato", "Thabo", "Nomsa", ""]
+STATUS = {
+    "lead_temperature": (["Hot", "Warm", "Cold", ""], [2, 4, 5, 1]),
+    "communication_status": (["New", "In Progress", "Pending", "Completed"], [5, 3, 2, 2]),
+    "registration_status": (["Not Registered", "Registered", "Activated"], [6, 3, 2]),
+    "lead_type": (["Prospect", "Customer", "Associate", ""], [6, 2, 2, 1]),
+    "associate_status": (["", "Active", "Inactive"], [6, 2, 1]),
+    "interest_level": (["High", "Medium", "Low", ""], [2, 3, 3, 2]),
+}
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d %b %Y", "%b %d, %Y", "%Y/%m/%d", "%d-%m-%Y"]
+
+def _weighted(rng, table):
+    names = list(table)
+    return rng.choices(names, weights=[table[n][0] for n in names])[0]
+
+def _phone(rng):
+    prefix = rng.choice(["60", "61", "71", "72", "73", "74", "76", "78", "79", "81", "82", "83", "84"])
+    rest = f"{rng.randrange(10**7):07d}"
+    return rng.choice([
+        f"0{prefix}{rest}",
+        f"0{prefix} {rest[:3]} {rest[3:]}",
+        f"+27 {prefix} {rest[:3]} {rest[3:]}",
+        f"+27{prefix}{rest}",
+        f"0027{prefix}{rest}",
+        f"(0{prefix}) {rest[:3]}-{rest[3:]}",
+    ])
+
+def _date(rng, start=date(2021, 1, 1), days=1800):
+    if rng.random() < 0.05:
+        return ""
+    d = start + timedelta(days=rng.randrange(days))
+    return d.strftime(rng.choice(DATE_FORMATS))
+
+def _near_duplicate(rng, rec):
+    # The same person captured again: shortened name, phone without its prefix or with
+    # one digit mistyped, no APL Go ID (so imports don't merge it), email kept or dropped
+    dup = dict(rec, apl_go_id="", tags="")
+    parts = rec["full_name"].split()
+    if rng.random() < 0.5:
+        dup["full_name"] = f"{parts[0]} {parts[-1][0]}"
+    digits = "".join(c for c in rec["phone_number"] if c.isdigit())[-9:]
+    if rng.random() < 0.5:
+        dup["phone_number"] = f"{digits[:2]} {digits[2:5]} {digits[5:]}"
+    else:
+        i = rng.randrange(2, 9)
+        dup["phone_number"] = "0" + digits[:i] + str((int(digits[i]) + 1) % 10) + digits[i + 1:]
+    if rng.random() < 0.5:
+        dup["email_address"] = ""
+    return dup
+
+def generate(n, seed=42, start=0, dup_rate=0.0):
+    # Yields n contact dicts keyed like db.COLUMNS (deterministic for a given seed).
+    # APL Go IDs / emails are numbered from start, so batches with different starts
+    # don't collide on the upsert keys. dup_rate: share of records that are near
+    # duplicates of an earlier one (see _near_duplicate).
+    rng = random.Random(seed)
+    sponsors = []          # names; appended per recruit so popular sponsors get picked more
+    recent = []            # candidates for near duplicates
+    for i in range(start, start + n):
+        if dup_rate and recent and rng.random() < dup_rate:
+            yield _near_duplicate(rng, rng.choice(recent))
+            continue
+        country = _weighted(rng, GEO)
+        provinces = GEO[country][1]
+        province = _weighted(rng, provinces)
+        city = rng.choice(provinces[province][1])
+        name = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+        if rng.random() < 0.1:
+            name = name.split()[0] + " " + name.split()[-1][0]      # "Thabo M"
+        rec = {k: "" for k in KEYS}
+        rec.update({k: rng.choices(vals, weights=w)[0] for k, (vals, w) in STATUS.items()})
+        sponsor = rng.choice(sponsors) if sponsors and rng.random() < 0.9 else ""
+        rec.update({
+            "date_captured": _date(rng),
+            "country": country,
+            "province": province,
+            "city": city,
+            "full_name": name,
+            "phone_number": _phone(rng),
+            "email_address": f"{name.lower().replace(' ', '.')}{i}@example.com" if rng.random() < 0.6 else "",
+            "assigned_to": rng.choice(AGENTS),
+            "sponsor_name": sponsor,
+            "next_action": _date(rng, date(2025, 1, 1), 500) if rng.random() < 0.4 else "",
+            "action_taken": rng.choice(["", "Called", "WhatsApp sent", "Emailed", "Met in person"]),
+            "apl_go_id": f"APL{i:07d}" if rec["registration_status"] != "Not Registered" else "",
+            "tags": ", ".join(sorted({TAGS[min(int(rng.paretovariate(1.2)) - 1, len(TAGS) - 1)]
+                                      for _ in range(rng.choice([0, 0, 1, 1, 2, 3]))})),
+        })
+        sponsors.append(name)
+        if sponsor:
+            sponsors.append(sponsor)
+        if dup_rate:
+            recent.append(rec)
+            if len(recent) > 1000:
+                recent.pop(rng.randrange(len(recent)))
+        yield rec
+
+def write_csv(path, n, seed=42, start=0, dup_rate=0.0):
+    # Same records with the human column labels, like a sponsor export / import file
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([lbl for _,lbl in COLUMNS])
+        for rec in generate(n, seed, start, dup_rate):
+            w.writerow([rec[k] for k in KEYS])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--start", type=int, default=0)
+    ap.add_argument("--dup-rate", type=float, default=0.0, help="share of near-duplicate records")
+    ap.add_argument("--csv", required=True)
+    args = ap.parse_args()
+    write_csv(args.csv, args.rows, args.seed, args.start, args.dup_rate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# bench/load.py — concurrent agent sessions against one database
+#
+#   python -m bench.load [--processes 4] [--sessions 4] [--seconds 20] [--rows 10000] [--queue]
+#                        [--out bench-load.json]
+#
+# Starts --processes worker processes (standing in for app instances behind a proxy), each
+# running --sessions threads that behave like agents on the Contacts page: page through
+# and search the table, save a few edited cells, Quick Add a contact, now and then tag a
+# batch or save a segment. Reports throughput, p50/p95 latency per action and the number
+# of failed calls ("database is locked" etc.). --queue turns on db's write queue
+# (group commits); run with and without it to compare.
+import argparse, json, multiprocessing, platform, random, sqlite3, tempfile, threading, time
+from datetime import datetime
+from pathlib import Path
+
+import db
+from bench.suite import load
+
+# action -> relative weight
+MIX = {
+    "page": 40, "search": 15, "count": 10, "follow_ups": 5,
+    "save_cells": 20, "quick_add": 6, "tag_batch": 3, "save_segment": 1,
+}
+
+def actions(rng, max_id, worker):
+    cities = ["Durban", "Cape Town", "Pretoria", "Soweto", "Polokwane"]
+    return {
+        "page": lambda: db.list_contacts({"lead_temperature": [rng.choice(["Hot", "Warm", "Cold"])]}, limit=50),
+        "search": lambda: db.list_contacts(search_query=rng.choice(["mokoena", "thabo", "082", "naledi"]), limit=50),
+        "count": lambda: db.count_contacts({"city": [rng.choice(cities)]}),
+        "follow_ups": lambda: db.follow_up_counts(),
+        "save_cells": lambda: db.update_rows([{"id": rng.randint(1, max_id), "city": rng.choice(cities),
+                                               "action_taken": f"call {rng.random():.6f}"}
+                                              for _ in range(rng.randint(1, 3))]),
+        "quick_add": lambda: db.insert_one({"full_name": f"Load {worker} {rng.random():.9f}",
+                                            "phone_number": f"07{rng.randrange(10**8):08d}"}, policy="fill_blanks"),
+        "tag_batch": lambda: db.update_tags(rng.sample(range(1, max_id + 1), 50), add_tags=[f"load-{worker}"]),
+        "save_segment": lambda: db.save_segment(f"load {worker}", {"city": [rng.choice(cities)]}),
+    }
+
+def session(worker, seconds, seed, out):
+    rng = random.Random(seed)
+    max_id = db.get_conn().execute(f"SELECT MAX(id) FROM {db.TABLE}").fetchone()[0]
+    acts = actions(rng, max_id, worker)
+    names, weights = list(MIX), list(MIX.values())
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        name = rng.choices(names, weights)[0]
+        t = time.perf_counter()
+        try:
+            acts[name]()
+            out.append((name, time.perf_counter() - t, None))
+        except Exception as e:
+            out.append((name, time.perf_counter() - t, f"{type(e).__name__}: {e}"))
+
+def worker_main(args):
+    worker, path, sessions, seconds, queue, seed = args
+    db.DB_PATH, db.SEGMENTS_PATH = Path(path), Path(path).with_suffix(".json")
+    db.configure_writes(queue=queue)
+    db.ensure_schema()
+    out = []
+    threads = [threading.Thread(target=session, args=(f"{worker}.{i}", seconds, seed * 1000 + worker * 100 + i, out))
+               for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db.close_all()
+    return out
+
+def pct(sorted_vals, p):
+    return sorted_vals[min(len(sorted_vals) - 1, int(p * len(sorted_vals)))] if sorted_vals else 0.0
+
+def summarize(calls, seconds):
+    by = {}
+    for name, took, err in calls:
+        by.setdefault(name, []).append((took, err))
+    res = {}
+    for name in ["all"] + sorted(by):
+        items = [(t, e) for n, t, e in calls] if name == "all" else by[name]
+        times = sorted(t for t, _ in items)
+        res[name] = {"calls": len(items), "per_sec": len(items) / seconds,
+                     "p50_ms": pct(times, 0.5) * 1000, "p95_ms": pct(times, 0.95) * 1000,
+                     "errors": sum(1 for _, e in items if e)}
+    return res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--sessions", type=int, default=4, help="agent sessions (threads) per process")
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--queue", action="store_true", help="route writes through the write queue")
+    ap.add_argument("--out", help="result JSON")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="vanto-load-"))
+    db.DB_PATH, db.SEGMENTS_PATH = tmp / "load.sqlite3", tmp / "segments.json"
+    load(args.rows, args.seed)
+    db.close_all()
+
+    jobs = [(w, str(db.DB_PATH), args.sessions, args.seconds, args.queue, args.seed) for w in range(args.processes)]
+    ctx = multiprocessing.get_context("spawn")
+    t0 = time.perf_counter()
+    with ctx.Pool(args.processes) as pool:
+        calls = [c for out in pool.map(worker_main, jobs) for c in out]
+    elapsed = time.perf_counter() - t0
+
+    res = summarize(calls, elapsed)
+    print(f"{args.processes} processes x {args.sessions} sessions, {elapsed:.1f}s, write queue {'on' if args.queue else 'off'}")
+    print(f"{'action':<14}{'calls':>8}{'per sec':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for name, r in res.items():
+        print(f"{name:<14}{r['calls']:>8}{r['per_sec']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}")
+    errors = sorted({e for _, _, e in calls if e})
+    for e in errors[:5]:
+        print("  error:", e)
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "meta": {"processes": args.processes, "sessions": args.sessions, "seconds": elapsed, "rows": args.rows,
+                     "queue": args.queue, "seed": args.seed, "timestamp": datetime.now().isoformat(timespec="seconds"),
+                     "python": platform.python_version(), "sqlite": sqlite3.sqlite_version},
+            "results": res,
+        }, indent=2), encoding="utf-8")
+        print(f"\nwrote {args.out}")
+
+if __name__ == "__main__":
+    main()
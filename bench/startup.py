@@ -0,0 +1,106 @@
+# bench/startup.py — cold start and rerun time of the Streamlit app, per page
+#
+#   python -m bench.startup [--rows 10000] [--out bench-startup.json] [--compare earlier.json]
+#
+# Every page is rendered in a fresh Python process with streamlit's AppTest (the same
+# script run the server does), so "first_render" includes the lazy page imports and the
+# schema check, like the first visit after a restart; "rerun" is the next run of the
+# same page. "import.*" is the import time of the modules every run needs. Times are
+# the best of --repeat processes; the JSON has the same shape as bench.suite's, so
+# --compare works the same way.
+import argparse, json, platform, subprocess, sys, tempfile
+from datetime import datetime
+from pathlib import Path
+
+import db
+from bench.suite import load, compare
+from views import PAGES
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, sys, time
+from pathlib import Path
+t = time.perf_counter()
+import streamlit
+t_st = time.perf_counter() - t
+t = time.perf_counter()
+import db, views
+t_app = time.perf_counter() - t
+from streamlit.testing.v1 import AppTest
+page, path = sys.argv[1], Path(sys.argv[2])
+db.DB_PATH, db.SEGMENTS_PATH = path, path.with_suffix(".json")
+at = AppTest.from_file(sys.argv[3], default_timeout=120)
+at.session_state["nav"] = page
+t = time.perf_counter()
+at.run()
+first = time.perf_counter() - t
+t = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - t
+print(json.dumps({"import.streamlit": t_st, "import.app": t_app, "first_render": first, "rerun": rerun,
+                  "errors": [str(e.value) for e in at.exception],
+                  "pandas": "pandas" in sys.modules}))
+"""
+
+def measure(page, path):
+    out = subprocess.run([sys.executable, "-c", CHILD, page, str(path), str(ROOT / "app.py")],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    if res["errors"]:
+        raise RuntimeError(f"{page}: {res['errors']}")
+    return res
+
+def run(rows, seed, repeat):
+    tmp = Path(tempfile.mkdtemp(prefix="vanto-startup-"))
+    db.close_all()
+    db.DB_PATH = tmp / "bench.sqlite3"
+    db.SEGMENTS_PATH = tmp / "segments.json"
+    load(rows, seed)
+    db.close_all()
+    results = {}
+    def keep(name, secs):
+        results[name] = {"seconds": min(secs, results.get(name, {}).get("seconds", secs))}
+    for page in PAGES:
+        for _ in range(repeat):
+            res = measure(page, db.DB_PATH)
+            keep("import.streamlit", res["import.streamlit"])
+            keep("import.app", res["import.app"])
+            keep(f"first_render.{page}", res["first_render"])
+            keep(f"rerun.{page}", res["rerun"])
+        results[f"first_render.{page}"]["pandas"] = res["pandas"]
+        print(f"{page:<18}first {results[f'first_render.{page}']['seconds'] * 1000:>8.0f} ms"
+              f"   rerun {results[f'rerun.{page}']['seconds'] * 1000:>7.0f} ms"
+              f"   pandas {'loaded' if res['pandas'] else 'not loaded'}", flush=True)
+    print(f"{'imports':<18}streamlit {results['import.streamlit']['seconds'] * 1000:.0f} ms"
+          f"   db+views {results['import.app']['seconds'] * 1000:.0f} ms")
+    return {
+        "meta": {
+            "rows": rows, "seed": seed, "repeat": repeat,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default="bench-startup.json")
+    ap.add_argument("--compare", help="earlier result JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2)
+    ap.add_argument("--min-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    res = run(args.rows, args.seed, args.repeat)
+    Path(args.out).write_text(json.dumps(res, indent=2), encoding="utf-8")
+    print(f"\nwrote {args.out}")
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(old, res, args.threshold, args.min_ms):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
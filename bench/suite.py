@@ -0,0 +1,179 @@
+# bench/suite.py — timing + peak memory of the db.py paths at realistic scale
+#
+#   python -m bench.suite --size 100k [--out bench-100k.json] [--compare previous.json]
+#   python -m bench.conn_overhead        (connection-layer micro-benchmark)
+#
+# Builds a fresh database from bench.generate (seeded, so runs are comparable), then
+# times each case. Times are the best of --repeat runs; peak memory (Python heap, via
+# tracemalloc) comes from one extra run, so tracing doesn't inflate the timings.
+# --compare prints the change against an earlier JSON result and exits non-zero when
+# a case got slower than --threshold.
+import argparse, itertools, json, os, platform, sqlite3, sys, tempfile, time, tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import db
+from bench.generate import generate, write_csv
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+LOAD_BATCH = 50_000
+
+def load(n, seed):
+    it = generate(n, seed)
+    while True:
+        batch = list(itertools.islice(it, LOAD_BATCH))
+        if not batch:
+            break
+        db.upsert_many(batch)
+    db.analyze()
+
+def cases(n, seed, tmp):
+    # name -> fn(i); i is the run number so write cases change data every run.
+    # A case may return its own duration to leave its setup out of the timing.
+    from exporter import export_contacts
+    import importer, dedupe
+    import pandas as pd
+
+    ids = [r[0] for r in db.get_conn().execute(f"SELECT id FROM {db.TABLE} ORDER BY random() LIMIT 5000")]
+    some = [{k: v for k, v in r.items() if k in ("full_name", "phone_number", "apl_go_id", "city")}
+            for r in db.list_contacts(limit=10000)]
+    mapping = {lbl: lbl for _, lbl in db.COLUMNS}
+    import_rows = min(n, 50_000)
+    db.save_segment("bench hot gauteng", {"province": ["Gauteng"], "lead_temperature": ["Hot"]})
+    db.save_segment("bench vip", {"tag_any": ["vip"]})
+    db.segment_counts()
+
+    def import_file(i):
+        # a new file each run (fresh APL Go IDs), so this measures inserts, not re-imports
+        path = tmp / f"import-{i}.csv"
+        write_csv(path, import_rows, seed + i, start=n + i * import_rows)
+        t = time.perf_counter()
+        with open(path, "rb") as f:
+            importer.import_stream(importer.iter_chunks(f), mapping)
+        path.unlink()
+        return time.perf_counter() - t
+
+    def reimport_file(i):
+        path = tmp / "reimport.csv"
+        if not path.exists():
+            write_csv(path, import_rows, seed)
+        with open(path, "rb") as f:
+            importer.import_stream(importer.iter_chunks(f), mapping)
+
+    def drain(f):
+        with f:
+            while f.read(1 << 20):
+                pass
+
+    return {
+        "list_contacts.page": lambda i: db.list_contacts(limit=50),
+        "list_contacts.page_filtered": lambda i: db.list_contacts(
+            {"country": ["South Africa"], "lead_temperature": ["Hot"]}, limit=50),
+        "list_contacts.page_search": lambda i: db.list_contacts(search_query="mokoena 082", limit=50),
+        "list_contacts.page_search_short": lambda i: db.list_contacts(search_query="th", limit=50),
+        "list_contacts.all_filtered": lambda i: db.list_contacts({"province": ["Gauteng"], "lead_temperature": ["Hot"]}),
+        "list_contacts.all_search": lambda i: db.list_contacts(search_query="thabo"),
+        "count_contacts.search": lambda i: db.count_contacts(search_query="mokoena"),
+        "unique_values.city": lambda i: (db._facet_cache.clear(), db.unique_values("city")),
+        "facets.cached": lambda i: db.facets(["country", "province", "city", "assigned_to", "sponsor_name", "tags"]),
+        "follow_up_counts": lambda i: db.follow_up_counts(),
+        "next_actions.due": lambda i: db.next_actions("due", limit=50),
+        "count_contacts.captured_month": lambda i: db.count_contacts(
+            {"date_captured_from": "2023-03-01", "date_captured_to": "2023-03-31"}),
+        "group_counts.dashboard": lambda i: db.group_counts(["lead_temperature", "communication_status", "registration_status"]),
+        "upsert_many.insert_10k": lambda i: db.upsert_many(list(generate(10_000, seed + i, start=2 * n + i * 10_000))),
+        "upsert_many.reimport_10k": lambda i: db.upsert_many(some),
+        "update_rows.1k": lambda i: db.update_rows([{"id": rid, "city": f"Bench {i}"} for rid in ids[:1000]]),
+        "update_tags.5k": lambda i: db.update_tags(ids, add_tags=[f"bench-{i}"], remove_tags=[f"bench-{i - 1}"]),
+        "segment_counts.after_update_1k": lambda i: (
+            db.update_rows([{"id": rid, "lead_temperature": ("Hot", "Warm")[i % 2]} for rid in ids[1000:2000]]),
+            db.segment_counts()),
+        "export_all": lambda i: db.export_all(),
+        # DataFrame of the whole table: dict rows -> object columns vs. columnar + categoricals
+        "frame.from_rows": lambda i: pd.DataFrame(db.list_contacts()),
+        "frame.from_columns": lambda i: db.to_frame(db.fetch_columns()),
+        "frame.snapshot_cached": lambda i: db.snapshot(),
+        "export_contacts.csv_gz": lambda i: drain(export_contacts("csv.gz")),
+        "export_since.last_10k": lambda i: sum(len(b) for b in db.export_since(max(db.change_head() - 10_000, 0))),
+        "dedupe.find": lambda i: dedupe.find_duplicates(),
+        "import.csv": import_file,
+        "import.csv_again": reimport_file,
+    }
+
+def run(size, seed, repeat, only=None):
+    n = SIZES[size]
+    tmp = Path(tempfile.mkdtemp(prefix="vanto-bench-"))
+    db.close_all()
+    db.DB_PATH = tmp / "bench.sqlite3"
+    db.SEGMENTS_PATH = tmp / "segments.json"
+    results = {}
+    t0 = time.perf_counter()
+    load(n, seed)
+    results["load"] = {"seconds": time.perf_counter() - t0}
+    counter = itertools.count(1)
+    for name, fn in cases(n, seed, tmp).items():
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        times = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            took = fn(next(counter))
+            times.append(took if isinstance(took, float) else time.perf_counter() - t)
+        tracemalloc.start()
+        fn(next(counter))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {"seconds": min(times), "peak_kib": peak // 1024}
+        print(f"{name:<34}{min(times) * 1000:>11.1f} ms{peak / 1024 / 1024:>10.1f} MiB", flush=True)
+    db.close_all()
+    return {
+        "meta": {
+            "size": size, "rows": n, "seed": seed, "repeat": repeat,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "db_bytes": os.path.getsize(tmp / "bench.sqlite3"),
+        },
+        "results": results,
+    }
+
+def compare(old, new, threshold, min_ms=1.0):
+    # Returns the names of cases that got slower than threshold (e.g. 0.2 = +20%) and by
+    # at least min_ms, so sub-millisecond noise doesn't count as a regression
+    slower = []
+    print(f"\n{'case':<34}{'before ms':>12}{'after ms':>12}{'change':>10}")
+    for name, res in new["results"].items():
+        prev = old["results"].get(name)
+        if not prev:
+            continue
+        b, a = prev["seconds"], res["seconds"]
+        change = (a - b) / b if b else 0.0
+        flag = ""
+        if change > threshold and (a - b) * 1000 >= min_ms:
+            slower.append(name)
+            flag = "  <-- slower"
+        print(f"{name:<34}{b * 1000:>12.1f}{a * 1000:>12.1f}{change:>+9.0%}{flag}")
+    return slower
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", choices=list(SIZES), default="10k")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="*", help="run only cases starting with these prefixes")
+    ap.add_argument("--out", help="result JSON (default bench-<size>.json)")
+    ap.add_argument("--compare", help="earlier result JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2)
+    ap.add_argument("--min-ms", type=float, default=1.0)
+    args = ap.parse_args()
+
+    res = run(args.size, args.seed, args.repeat, args.only)
+    out = args.out or f"bench-{args.size}.json"
+    Path(out).write_text(json.dumps(res, indent=2), encoding="utf-8")
+    print(f"\nwrote {out}")
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(old, res, args.threshold, args.min_ms):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
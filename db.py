@@ -1,8 +1,14 @@
 # db.py
-import sqlite3, json
+import sqlite3, functools, json, logging, os, queue, random, re, threading, time, weakref
+from collections import deque
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
+log = logging.getLogger(__name__)
+
 DB_PATH = Path(__file__).with_name("crm.sqlite3")
+# Legacy segment store; imported into SEGMENTS_TABLE once by migrate()
 SEGMENTS_PATH = Path(__file__).with_name("segments.json")
 
 # 20 agreed columns (snake keys ↔ labels) + optional tags
@@ -31,15 +37,502 @@ COLUMNS = [
 ]
 
 TABLE = "contacts"
+FTS_TABLE = "contacts_fts"
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+# Columns covered by the global search box (and the FTS index)
+SEARCH_COLUMNS = [
+    "full_name", "phone_number", "email_address", "sponsor_name", "apl_go_id",
+    "city", "province", "country", "interest_level", "tags",
+]
+
+# Per-value counts kept in COUNTS_TABLE by triggers (Dashboard KPIs / group_counts)
+COUNTS_TABLE = "contact_counts"
+SUMMARY_COLUMNS = [
+    "lead_temperature", "communication_status", "registration_status",
+    "assigned_to", "sponsor_name", "country", "province", "city",
+]
+
+# Managed secondary indexes on contacts: (columns, nocase). ensure_indexes() creates
+# missing ones and drops stale "ix_contacts__*" indexes on every process start.
+# nocase=True builds the index with COLLATE NOCASE; only useful for queries that compare
+# with COLLATE NOCASE too, and none of the current filters do (they match exact values).
+MANAGED_INDEXES = [
+    (("lead_temperature",), False),
+    (("communication_status",), False),
+    (("registration_status",), False),
+    (("country", "province", "city"), False),
+    (("province", "city"), False),
+    (("city",), False),
+    (("assigned_to", "lead_temperature"), False),
+    (("sponsor_name",), False),
+    (("next_action_day",), False),
+    (("date_captured_day",), False),
+]
+INDEX_PREFIX = f"ix_{TABLE}__"
+
+# Append-only log of contact ids touched by inserts/updates/deletes (trigger-maintained);
+# compact_changes() trims what every consumer has already seen
+CHANGES_TABLE = "contact_changes"
+# Log entries kept after every consumer has seen them, so ad-hoc export_since() callers
+# still get recent deltas, and the hard cap; consumers further behind than that resync.
+CHANGES_RETAIN = 50_000
+CHANGES_MAX = 1_000_000
+# META_TABLE key prefix for registered change consumers (value = last seq they applied)
+CONSUMER_PREFIX = "changes_consumer:"
+
+# Saved segments: filters compiled to SQL, with cached member ids/counts kept up to
+# date from CHANGES_TABLE by refresh_segments()
+SEGMENTS_TABLE = "segments"
+SEGMENT_MEMBERS_TABLE = "segment_members"
+# Above this many changed contacts a segment is rebuilt instead of patched
+SEGMENT_FULL_REFRESH = 20000
+
+# Likely duplicate contacts found by dedupe.find_duplicates() (pairs with a < b)
+DUPLICATES_TABLE = "duplicate_pairs"
+
+# Background jobs (see jobs.py): state is queued/running/done/failed/cancelled; a running
+# job's owner (host:pid) refreshes heartbeat_at while it runs
+JOBS_TABLE = "jobs"
+
+# Key/value table; "contacts_version" is bumped by triggers on every contacts write
+META_TABLE = "db_meta"
+
+# One row per (contact, tag), derived from contacts.tags by triggers
+TAGS_TABLE = "contact_tags"
+# Special list_contacts() filter keys backed by TAGS_TABLE
+TAG_FILTERS = ["tag_any", "tag_all"]
+# Special filter keys for date ranges: key -> (DATE_COLUMNS column, operator). Values are
+# dates or date strings; both ends are inclusive.
+DATE_FILTERS = {
+    "date_captured_from": ("date_captured_day", ">="),
+    "date_captured_to": ("date_captured_day", "<="),
+    "next_action_from": ("next_action_day", ">="),
+    "next_action_to": ("next_action_day", "<="),
+}
+# Filter key for a FOLLOW_UP_WINDOWS window by name ("today", ...): resolved against the
+# current date whenever the query runs, so a saved segment keeps meaning "due today"
+FOLLOW_UP_FILTER = "follow_up"
+
+# Upsert keys: normalized shadows of apl_go_id / phone_number with UNIQUE indexes
+# (key column, source column, SQL normalizer registered in _connect)
+KEY_COLUMNS = [("apl_key", "apl_go_id", "norm_apl"), ("phone_key", "phone_number", "norm_phone")]
+# Date shadows: the free-text date columns as YYYYMMDD integers (NULL when blank or
+# unparseable), so date ranges are index range scans
+DATE_COLUMNS = [("date_captured_day", "date_captured", "norm_date"), ("next_action_day", "next_action", "norm_date")]
+# Everything upsert_many()/update_rows() derive from a source column on write
+SHADOW_COLUMNS = KEY_COLUMNS + DATE_COLUMNS
+# Rows per committed batch when back-filling DATE_COLUMNS on an existing database
+BACKFILL_BATCH = 5000
+UPSERT_POLICIES = ["overwrite", "fill_blanks", "skip"]
+DEFAULT_COUNTRY_CODE = "27"
+
+# Set by ensure_schema(): True when the trigram FTS5 index exists and is usable
+FTS_ENABLED = False
+
+# Bump when migrate() gains new steps; stored in PRAGMA user_version
+SCHEMA_VERSION = 13
+
+# Applied to every new connection
+PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("cache_size", -32000),      # KiB, i.e. ~32 MB page cache
+    ("mmap_size", 268435456),    # 256 MB
+    ("temp_store", "MEMORY"),
+]
+MAX_IDLE_CONNS = 8
+
+_local = threading.local()
+_idle = {}                # db path -> connections released by finished threads
+_idle_lock = threading.Lock()
+_schema_ready = set()     # db paths already checked by this process
+_schema_lock = threading.Lock()
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for k, v in PRAGMAS:
+        conn.execute(f"PRAGMA {k}={v}")
+    # substring search fallback when FTS5 is unavailable (see search_clause)
+    conn.create_function("like_nocase", 2, lambda a,b: (a or "").lower().find((b or "").lower()) != -1)
+    for name, fn in NORMALIZERS.items():
+        conn.create_function(name, 1, fn, deterministic=True)
     return conn
 
+_CONTROL_RE = re.compile(r"[\x01-\x1f]")
+
+def clean_tags(val):
+    # Control characters (tabs, line breaks, ...) in a tags string become spaces, so the
+    # stored string and its contact_tags rows (and tag filters) agree
+    return _CONTROL_RE.sub(" ", val) if isinstance(val, str) else val
+
+def normalize_apl_id(val):
+    val = str(val or "").strip().upper()
+    return val or None
+
+def normalize_phone(val):
+    # "+27 82 555 1234", "0825551234" and "0027825551234" all become "27825551234"
+    digits = re.sub(r"\D", "", str(val or ""))
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 10 and digits.startswith("0"):
+        digits = DEFAULT_COUNTRY_CODE + digits[1:]
+    return digits or None
+
+ISO_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})$")
+YEAR_FIRST = re.compile(r"\d{4}\D")
+
+# Two fill-in dates differing in year, month and day: a string parses to the same date
+# with both only if it names all three itself
+_DATE_PROBES = (datetime(1904, 1, 1), datetime(1905, 2, 2))
+
+def parse_date_text(s):
+    # Free-text date -> datetime.date (raises ValueError/OverflowError). Numeric dates are
+    # day first, as in South African exports: "07/03/2025" is 7 March. Strings starting with
+    # a 4-digit year stay year/month/day ("2025/03/07"), and a date that can't be day
+    # first ("03/25/2025") is read month first. Partial dates ("Friday", "15 March",
+    # "2025") raise ValueError instead of being completed from today. Used by the
+    # importer and forms as well.
+    from dateutil import parser as dtparser
+    s = s.strip()
+    a, b = (dtparser.parse(s, dayfirst=not YEAR_FIRST.match(s), default=d).date() for d in _DATE_PROBES)
+    if a != b:
+        raise ValueError(f"Incomplete date: {s!r}")
+    return a
+
+@functools.lru_cache(maxsize=65536)
+def normalize_date(val):
+    # "2025-03-07", "7 Mar 2025", "07/03/2025" ... -> 20250307; None when blank, unparseable
+    # or partial. Non-ISO strings are read by parse_date_text(); the result never depends on
+    # today's date, so it can be cached (and registered as a deterministic SQL function).
+    s = str(val or "").strip()
+    if not s:
+        return None
+    m = ISO_DATE.match(s[:10])
+    if m:
+        y, mo, d = map(int, m.groups())
+    else:
+        try:
+            parsed = parse_date_text(s)
+        except (ValueError, OverflowError):
+            return None
+        y, mo, d = parsed.year, parsed.month, parsed.day
+    try:
+        return to_day(date(y, mo, d))
+    except ValueError:
+        return None
+
+def to_day(d):
+    # date -> YYYYMMDD integer as stored in DATE_COLUMNS
+    return d.year * 10000 + d.month * 100 + d.day
+
+# SQL name -> Python normalizer; registered on every connection (see KEY_COLUMNS, DATE_COLUMNS)
+NORMALIZERS = {"norm_apl": normalize_apl_id, "norm_phone": normalize_phone, "norm_date": normalize_date,
+               "norm_tags": clean_tags}
+
+def _release(path, conn):
+    try:
+        conn.rollback()
+    except sqlite3.Error:
+        return
+    with _idle_lock:
+        pool = _idle.setdefault(path, [])
+        if len(pool) < MAX_IDLE_CONNS:
+            pool.append(conn)
+            return
+    conn.close()
+
+class _ConnHolder:
+    # Lives in thread-local storage. Streamlit runs every rerun in a new thread; when
+    # that thread exits the holder is collected and its connection goes back to the
+    # idle pool, so the next rerun picks it up instead of reconnecting.
+    def __init__(self, path, conn):
+        self.path = path
+        self.conn = conn
+        self.finalizer = weakref.finalize(self, _release, path, conn)
+
+def get_conn():
+    # Per-thread connection, reused across calls. Callers must not close it; contact
+    # writes go through _write(), other writes should run inside `with conn:` so they
+    # commit (or roll back) as a unit.
+    path = str(DB_PATH)
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.path != path:
+        with _idle_lock:
+            pool = _idle.get(path)
+            conn = pool.pop() if pool else None
+        holder = _local.holder = _ConnHolder(path, conn or _connect(path))
+    return holder.conn
+
+def close_all():
+    # Close this thread's connection and every idle one (tests, benchmarks, file swaps).
+    holder = getattr(_local, "holder", None)
+    if holder is not None:
+        holder.finalizer.detach()
+        holder.conn.close()
+        del _local.holder
+    with _idle_lock:
+        for pool in _idle.values():
+            for conn in pool:
+                conn.close()
+        _idle.clear()
+    _schema_ready.clear()
+    with _writers_lock:
+        for w in _writers.values():
+            w.stop()
+        _writers.clear()
+
+# -------- Tracing --------
+# Opt-in per thread with start_collecting(); slow calls are appended (JSON lines) to SLOW_QUERY_LOG
+# when it is set. Both can be configured with VANTO_SLOW_QUERY_LOG / VANTO_SLOW_QUERY_MS.
+SLOW_QUERY_LOG = os.environ.get("VANTO_SLOW_QUERY_LOG", "")
+SLOW_QUERY_MS = float(os.environ.get("VANTO_SLOW_QUERY_MS", "250"))
+MAX_TRACED_STATEMENTS = 50
+
+RECENT_QUERIES = deque(maxlen=500)   # last traced calls, all threads
+_slow_lock = threading.Lock()
+
+def configure_tracing(slow_query_log=None, slow_query_ms=None):
+    global SLOW_QUERY_LOG, SLOW_QUERY_MS
+    if slow_query_log is not None:
+        SLOW_QUERY_LOG = str(slow_query_log)
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = float(slow_query_ms)
+
+def start_collecting():
+    # Record this thread's traced db calls (see traced() for the record layout) into a
+    # fresh list, replacing any previous collection; returns that list.
+    _local.collector = []
+    return _local.collector
+
+def stop_collecting():
+    calls = getattr(_local, "collector", None)
+    _local.collector = None
+    return calls or []
+
+def _row_count(res):
+    if isinstance(res, (list, tuple)):
+        return len(res)
+    if isinstance(res, dict) and all(isinstance(v, int) for v in res.values()):
+        return sum(res.values())
+    if isinstance(res, int) and not isinstance(res, bool):
+        return res
+    return None
+
+def traced(fn):
+    # Times the outermost db call on this thread and, while collecting or slow-logging,
+    # captures the SQL it ran via sqlite3's trace callback (trigger statements included).
+    # Record: {"fn", "seconds", "rows", "statements": [{"sql", "seconds"}], "more"}.
+    # Statement durations run until the next statement starts, so they are approximate.
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        collector = getattr(_local, "collector", None)
+        if getattr(_local, "span", None) is not None or (collector is None and not SLOW_QUERY_LOG):
+            return fn(*args, **kwargs)
+        span = _local.span = {"fn": fn.__name__, "statements": [], "more": 0}
+        stamps = []
+        def on_statement(sql):
+            if len(span["statements"]) < MAX_TRACED_STATEMENTS:
+                span["statements"].append({"sql": sql})
+                stamps.append(time.perf_counter())
+            else:
+                span["more"] += 1
+        conn = get_conn()
+        conn.set_trace_callback(on_statement)
+        t0 = time.perf_counter()
+        try:
+            res = fn(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            conn.set_trace_callback(None)
+            _local.span = None
+        for st, t, nxt in zip(span["statements"], stamps, stamps[1:] + [end]):
+            st["seconds"] = nxt - t
+        span["seconds"] = end - t0
+        span["rows"] = _row_count(res)
+        RECENT_QUERIES.append(span)
+        if collector is not None:
+            collector.append(span)
+        if SLOW_QUERY_LOG and span["seconds"] * 1000 >= SLOW_QUERY_MS:
+            _log_slow(span)
+        return res
+    return wrapper
+
+def _log_slow(span):
+    line = json.dumps(dict(span, ts=time.strftime("%Y-%m-%dT%H:%M:%S"), db=str(DB_PATH)))
+    with _slow_lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+# -------- Writes --------
+# Every write runs as an op(conn) inside one BEGIN IMMEDIATE transaction, retried with
+# backoff while another connection (or another app process) holds the write lock. With the
+# write queue on (VANTO_WRITE_QUEUE=1 or configure_writes(queue=True); meant for several
+# app instances sharing one database) ops are handed to a single writer thread per process,
+# which runs everything that queued up meanwhile (up to WRITE_GROUP ops) in one transaction,
+# so bursts of small saves share a commit. A failing op raises in its caller without
+# affecting the others (see _run_ops). Reads stay on the
+# per-thread connections (WAL: they see the last commit and never wait for the writer).
+# Traced write calls then include the queue wait, but their SQL runs on the writer's
+# connection and isn't captured.
+WRITE_QUEUE = os.environ.get("VANTO_WRITE_QUEUE", "") == "1"
+WRITE_GROUP = 64
+WRITE_RETRIES = 8
+WRITE_BACKOFF = 0.05      # seconds before the first retry; doubles each time (with jitter)
+
+_writers = {}             # db path -> _Writer
+_writers_lock = threading.Lock()
+
+def configure_writes(queue=None):
+    global WRITE_QUEUE
+    if queue is not None:
+        WRITE_QUEUE = bool(queue)
+
+def _is_busy(e):
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e))
+
+class _Rerun(Exception):
+    # Raised by an op to have its transaction rolled back and the op run again on its own
+    # (upsert_many does this to fall back to row by row after an IntegrityError)
+    pass
+
+def _run_group(conn, ops):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        res = [op(conn) for op in ops]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return res
+
+def _run_ops(conn, ops):
+    # -> [(ok, result or exception)] per op, all committed together. Busy errors abort
+    # the whole group (it is retried by _run_with_retry). No savepoints: trigger-heavy
+    # statements run several times slower inside one, so a group runs plainly and only
+    # if one of its ops fails is it rolled back and each op run in its own transaction.
+    try:
+        return [(True, res) for res in _run_group(conn, ops)]
+    except Exception as e:
+        if _is_busy(e):
+            raise
+        if len(ops) == 1 and not isinstance(e, _Rerun):
+            return [(False, e)]
+    out = []
+    for op in ops:
+        try:
+            out.append(_run_with_retry(conn, [op])[0])
+        except sqlite3.OperationalError as e:
+            out.append((False, e))
+    return out
+
+def _run_with_retry(conn, ops):
+    delay = WRITE_BACKOFF
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            return _run_ops(conn, ops)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == WRITE_RETRIES:
+                raise
+            time.sleep(delay * (0.5 + random.random()))
+            delay *= 2
+
+class _Writer:
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="vanto-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, op):
+        fut = Future()
+        self.queue.put((op, fut))
+        return fut
+
+    def stop(self):
+        self.queue.put(None)
+
+    def _loop(self):
+        conn = _connect(self.path)
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < WRITE_GROUP:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)    # finish this group, then stop
+                    break
+                batch.append(item)
+            try:
+                results = _run_with_retry(conn, [op for op, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), (ok, res) in zip(batch, results):
+                if ok:
+                    fut.set_result(res)
+                else:
+                    fut.set_exception(res)
+        conn.close()
+
+def _writer():
+    path = str(DB_PATH)
+    with _writers_lock:
+        w = _writers.get(path)
+        if w is None:
+            w = _writers[path] = _Writer(path)
+        return w
+
+def _write(op):
+    # Runs op(conn) as a write transaction (see above) and returns its result. op must not
+    # commit, and callers run ensure_schema() first (the writer thread has its own connection).
+    if WRITE_QUEUE:
+        return _writer().submit(op).result()
+    ok, res = _run_with_retry(get_conn(), [op])[0]
+    if not ok:
+        raise res
+    return res
+
 def ensure_schema():
-    conn = get_conn()
-    cur = conn.cursor()
+    # Checked once per process per database file: if PRAGMA user_version is current the
+    # schema is left alone, otherwise migrate() runs and stamps the new version.
+    path = str(DB_PATH)
+    if path in _schema_ready:
+        return
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        conn = get_conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            with conn:
+                migrate(conn.cursor(), version)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        else:
+            _detect_fts(conn)
+        backfill_dates()
+        with conn:
+            if ensure_indexes(conn.cursor()):
+                analyze()
+        _schema_ready.add(path)
+
+def _detect_fts(conn):
+    global FTS_ENABLED
+    try:
+        conn.execute(f"SELECT rowid FROM {FTS_TABLE} LIMIT 0")
+        FTS_ENABLED = True
+    except sqlite3.OperationalError:
+        FTS_ENABLED = False
+
+def migrate(cur, version=0):
+    # Idempotent: safe to re-run on any older database (adds missing columns, indexes, triggers).
+    # version is the database's previous user_version, for steps that must redo older objects.
     cols_sql = ", ".join([f"{k} TEXT" for k, _ in COLUMNS])
     cur.execute(f"""
         CREATE TABLE IF NOT EXISTS {TABLE} (
@@ -54,24 +547,447 @@ def ensure_schema():
     for k, _ in COLUMNS:
         if k not in existing:
             cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN {k} TEXT;")
+    if "phone_key" not in existing:
+        ensure_keys(cur)
+    for key, _, _ in KEY_COLUMNS:
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{TABLE}_{key} ON {TABLE}({key})")
+    ensure_fts(cur)
+    ensure_counts(cur)
+    if version < 11:
+        # tags triggers now accept any control character (they used to fail on all but
+        # tab/CR/LF, which they indexed as spaces); stored tags get the same cleanup
+        cur.execute(f"DROP TRIGGER IF EXISTS {TABLE}_tags_ai")
+        cur.execute(f"DROP TRIGGER IF EXISTS {TABLE}_tags_au")
+        cur.execute(f"UPDATE {TABLE} SET tags = norm_tags(tags) WHERE tags <> norm_tags(tags)")
+    ensure_tags(cur)
+    if 0 < version < 7:
+        # these now fire only when contact data changes, not on shadow-column writes
+        cur.execute(f"DROP TRIGGER IF EXISTS {TABLE}_version_au")
+        cur.execute(f"DROP TRIGGER IF EXISTS {TABLE}_changes_au")
+    ensure_meta(cur)
+    ensure_dates(cur)
+    if version < 13:
+        # normalize_date() now reads numeric dates day first (v12) and leaves partial dates
+        # NULL (v13): recompute the date shadows
+        cur.execute(f"INSERT OR REPLACE INTO {META_TABLE}(key, value) VALUES ('dates_backfill_from', 0)")
+    ensure_changes(cur)
+    ensure_segments(cur)
+    ensure_jobs(cur)
+    ensure_duplicates(cur)
+
+def _index_sql(name, columns, nocase):
+    cols = ", ".join([f"{c} COLLATE NOCASE" if nocase else c for c in columns])
+    return f"CREATE INDEX {name} ON {TABLE}({cols})"
+
+def ensure_indexes(cur):
+    # Returns True if any index was created or dropped
+    want = {}
+    for columns, nocase in MANAGED_INDEXES:
+        name = INDEX_PREFIX + "__".join(columns) + ("__nocase" if nocase else "")
+        want[name] = _index_sql(name, columns, nocase)
+    have = {r[0]: r[1] for r in cur.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=?", (TABLE,)).fetchall()
+        if r[0].startswith(INDEX_PREFIX)}
+    changed = False
+    for name, sql in have.items():
+        if want.get(name) != sql:
+            cur.execute(f"DROP INDEX {name}")
+            changed = True
+    for name, sql in want.items():
+        if have.get(name) != sql:
+            cur.execute(sql)
+            changed = True
+    return changed
+
+@traced
+def analyze():
+    # Refresh planner statistics (after bulk imports / index changes). analysis_limit
+    # samples each index instead of reading it fully, so this stays fast on big tables.
+    conn = get_conn()
+    conn.execute("PRAGMA analysis_limit=1000")
+    conn.execute("ANALYZE")
     conn.commit()
-    conn.close()
-    # ensure segments file
-    if not SEGMENTS_PATH.exists():
-        SEGMENTS_PATH.write_text("{}", encoding="utf-8")
 
-def list_contacts(filters=None, search_query=""):
-    ensure_schema()
+def _data_columns():
+    # the user-visible columns; writes that only touch shadow columns aren't contact changes
+    return ", ".join(k for k,_ in COLUMNS)
+
+def ensure_meta(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+          key TEXT PRIMARY KEY,
+          value INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    cur.execute(f"INSERT OR IGNORE INTO {META_TABLE}(key, value) VALUES ('contacts_version', 0)")
+    bump = f"UPDATE {META_TABLE} SET value = value + 1 WHERE key = 'contacts_version';"
+    cur.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_version_ai AFTER INSERT ON {TABLE} BEGIN {bump} END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_version_au AFTER UPDATE OF {_data_columns()} ON {TABLE} BEGIN {bump} END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_version_ad AFTER DELETE ON {TABLE} BEGIN {bump} END;
+    """)
+
+def ensure_dates(cur):
+    # Adds DATE_COLUMNS (+ indexes via MANAGED_INDEXES). Existing rows are filled in by
+    # backfill_dates() in committed batches; the 'dates_backfill_from' meta row is its
+    # resume point and is removed when the backfill is complete.
+    have = {r[1] for r in cur.execute(f"PRAGMA table_info({TABLE})")}
+    missing = [c for c,_,_ in DATE_COLUMNS if c not in have]
+    for c in missing:
+        cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN {c} INTEGER")
+    if missing:
+        cur.execute(f"INSERT OR REPLACE INTO {META_TABLE}(key, value) VALUES ('dates_backfill_from', 0)")
+
+def backfill_dates(batch=BACKFILL_BATCH):
+    # Returns the number of rows updated (0 when there is nothing left to do)
     conn = get_conn()
-    conn.create_function("like_nocase", 2, lambda a,b: (a or "").lower().find((b or "").lower()) != -1)
-    cur = conn.cursor()
+    row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'dates_backfill_from'").fetchone()
+    if not row:
+        return 0
+    start, done = row[0], 0
+    sets = ", ".join(f"{c} = {fn}({src})" for c, src, fn in DATE_COLUMNS)
+    while True:
+        with conn:
+            end = conn.execute(f"SELECT MAX(id) FROM (SELECT id FROM {TABLE} WHERE id > ? ORDER BY id LIMIT ?)",
+                               (start, batch)).fetchone()[0]
+            if end is None:
+                conn.execute(f"DELETE FROM {META_TABLE} WHERE key = 'dates_backfill_from'")
+                return done
+            done += conn.execute(f"UPDATE {TABLE} SET {sets} WHERE id > ? AND id <= ?", (start, end)).rowcount
+            conn.execute(f"UPDATE {META_TABLE} SET value = ? WHERE key = 'dates_backfill_from'", (end,))
+        start = end
+
+def ensure_changes(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+          seq INTEGER PRIMARY KEY AUTOINCREMENT,
+          contact_id INTEGER NOT NULL,
+          op TEXT NOT NULL,
+          changed_at TEXT DEFAULT (datetime('now'))
+        );
+    """)
+    cur.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_changes_ai AFTER INSERT ON {TABLE} BEGIN
+          INSERT INTO {CHANGES_TABLE}(contact_id, op) VALUES (new.id, 'I');
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_changes_au AFTER UPDATE OF {_data_columns()} ON {TABLE} BEGIN
+          INSERT INTO {CHANGES_TABLE}(contact_id, op) VALUES (new.id, 'U');
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_changes_ad AFTER DELETE ON {TABLE} BEGIN
+          INSERT INTO {CHANGES_TABLE}(contact_id, op) VALUES (old.id, 'D');
+        END;
+    """)
+    # 'changes_floor': everything up to this seq may have been compacted away
+    cur.execute(f"""
+        INSERT OR IGNORE INTO {META_TABLE}(key, value) VALUES ('changes_floor', coalesce(
+          (SELECT MIN(seq) - 1 FROM {CHANGES_TABLE}),
+          (SELECT seq FROM sqlite_sequence WHERE name = '{CHANGES_TABLE}'), 0))
+    """)
+
+def ensure_jobs(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {JOBS_TABLE} (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          kind TEXT NOT NULL,
+          label TEXT,
+          params TEXT NOT NULL,
+          state TEXT NOT NULL DEFAULT 'queued',
+          done INTEGER NOT NULL DEFAULT 0,
+          total INTEGER,
+          checkpoint TEXT,
+          result TEXT,
+          error TEXT,
+          cancel_requested INTEGER NOT NULL DEFAULT 0,
+          created_at TEXT DEFAULT (datetime('now')),
+          started_at TEXT,
+          finished_at TEXT,
+          updated_at TEXT,
+          owner TEXT,
+          heartbeat_at TEXT
+        );
+    """)
+    existing = {r["name"] for r in cur.execute(f"PRAGMA table_info({JOBS_TABLE})").fetchall()}
+    for col in ("owner", "heartbeat_at"):
+        if col not in existing:
+            cur.execute(f"ALTER TABLE {JOBS_TABLE} ADD COLUMN {col} TEXT")
+
+def ensure_duplicates(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DUPLICATES_TABLE} (
+          a INTEGER NOT NULL,
+          b INTEGER NOT NULL,
+          score REAL NOT NULL,
+          PRIMARY KEY (a, b)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS ix_{DUPLICATES_TABLE}_b ON {DUPLICATES_TABLE}(b)")
+
+def ensure_segments(cur):
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name=?", (SEGMENTS_TABLE,)).fetchone()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SEGMENTS_TABLE} (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          name TEXT NOT NULL UNIQUE,
+          filters TEXT NOT NULL,
+          where_sql TEXT NOT NULL,
+          params TEXT NOT NULL,
+          member_count INTEGER NOT NULL DEFAULT 0,
+          synced_seq INTEGER NOT NULL DEFAULT -1,
+          created_at TEXT DEFAULT (datetime('now')),
+          updated_at TEXT
+        );
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SEGMENT_MEMBERS_TABLE} (
+          segment_id INTEGER NOT NULL,
+          contact_id INTEGER NOT NULL,
+          PRIMARY KEY (segment_id, contact_id)
+        ) WITHOUT ROWID;
+    """)
+    if not exists and SEGMENTS_PATH.exists():
+        # one-time import of the old JSON store (the file itself is left in place). Entries
+        # that aren't valid segments are skipped and logged, so a bad file can't stop startup.
+        try:
+            legacy = json.loads(SEGMENTS_PATH.read_text(encoding="utf-8"))
+        except ValueError:
+            legacy = {}
+        if not isinstance(legacy, dict):
+            log.warning("%s: expected {name: filters}, not imported", SEGMENTS_PATH)
+            legacy = {}
+        for name, filters in legacy.items():
+            try:
+                if not isinstance(filters, dict):
+                    raise ValueError("filters are not a {key: value} object")
+                _store_segment(cur, name, filters)
+            except (ValueError, TypeError, AttributeError) as e:
+                log.warning("%s: segment %r skipped: %s", SEGMENTS_PATH, name, e)
+
+def ensure_keys(cur):
+    # Adds and back-fills the upsert key columns. Rows that already share a key (from
+    # earlier plain-INSERT imports) are kept, but only the oldest one keeps the key;
+    # the others get NULL so the UNIQUE indexes can be built without deleting data.
+    for key, src, fn in KEY_COLUMNS:
+        cur.execute(f"ALTER TABLE {TABLE} ADD COLUMN {key} TEXT;")
+        cur.execute(f"UPDATE {TABLE} SET {key} = {fn}({src})")
+    for key, _, _ in KEY_COLUMNS:
+        cur.execute(f"""
+            UPDATE {TABLE} SET {key} = NULL WHERE id IN (
+              SELECT c.id FROM {TABLE} c JOIN (
+                SELECT {key} AS k, MIN(id) AS keep FROM {TABLE}
+                WHERE {key} IS NOT NULL GROUP BY {key} HAVING COUNT(*) > 1
+              ) d ON c.{key} = d.k AND c.id <> d.keep
+            )
+        """)
+
+def ensure_fts(cur):
+    # Trigram FTS5 index over SEARCH_COLUMNS, kept in sync by triggers.
+    # The trigram tokenizer matches arbitrary substrings (>= 3 chars) case-insensitively,
+    # so search results stay the same as the old substring scan.
+    global FTS_ENABLED
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name=?", (FTS_TABLE,)).fetchone()
+    cols = ", ".join(SEARCH_COLUMNS)
+    try:
+        cur.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+              {cols}, content='{TABLE}', content_rowid='id', tokenize='trigram'
+            );
+        """)
+    except sqlite3.OperationalError:
+        # FTS5 (or the trigram tokenizer) not compiled in -> substring scan fallback
+        FTS_ENABLED = False
+        return
+    new_vals = ", ".join([f"new.{k}" for k in SEARCH_COLUMNS])
+    old_vals = ", ".join([f"old.{k}" for k in SEARCH_COLUMNS])
+    cur.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_fts_ai AFTER INSERT ON {TABLE} BEGIN
+          INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_fts_ad AFTER DELETE ON {TABLE} BEGIN
+          INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_fts_au AFTER UPDATE OF {cols} ON {TABLE} BEGIN
+          INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+          INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+    """)
+    if not exists:
+        # first run on an existing database: index the rows already there
+        cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    FTS_ENABLED = True
+
+def ensure_counts(cur):
+    # COUNTS_TABLE holds one row per (column, value) for SUMMARY_COLUMNS plus ('*', '') = total.
+    # NULL and '' are both stored as ''.
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name=?", (COUNTS_TABLE,)).fetchone()
+    if exists and _counts_outdated(cur):
+        drop_counts(cur)
+        exists = None
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {COUNTS_TABLE} (
+          col TEXT NOT NULL,
+          val TEXT NOT NULL,
+          n INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (col, val)
+        ) WITHOUT ROWID;
+    """)
+    inc = "INSERT INTO {t}(col, val, n) VALUES ('{c}', {v}, 1) ON CONFLICT(col, val) DO UPDATE SET n = n + 1;"
+    dec = "UPDATE {t} SET n = n - 1 WHERE col = '{c}' AND val = {v};"
+    ins = [inc.format(t=COUNTS_TABLE, c="*", v="''")]
+    dels = [dec.format(t=COUNTS_TABLE, c="*", v="''")]
+    for k in SUMMARY_COLUMNS:
+        ins.append(inc.format(t=COUNTS_TABLE, c=k, v=f"coalesce(new.{k}, '')"))
+        dels.append(dec.format(t=COUNTS_TABLE, c=k, v=f"coalesce(old.{k}, '')"))
+    script = f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_counts_ai AFTER INSERT ON {TABLE} BEGIN
+          {" ".join(ins)}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_counts_ad AFTER DELETE ON {TABLE} BEGIN
+          {" ".join(dels)}
+        END;
+    """
+    for k in SUMMARY_COLUMNS:
+        script += f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_counts_au_{k} AFTER UPDATE OF {k} ON {TABLE}
+        WHEN old.{k} IS NOT new.{k} BEGIN
+          {dec.format(t=COUNTS_TABLE, c=k, v=f"coalesce(old.{k}, '')")}
+          {inc.format(t=COUNTS_TABLE, c=k, v=f"coalesce(new.{k}, '')")}
+        END;
+        """
+    cur.executescript(script)
+    if not exists:
+        rebuild_counts(cur)
+
+def _counts_outdated(cur):
+    # True when COUNTS_TABLE was built for fewer SUMMARY_COLUMNS (it predates province/city,
+    # possibly from before PRAGMA user_version was stamped): a column without its triggers,
+    # or without rows while there are contacts
+    triggers = {r[0]: r[1] for r in cur.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE ?", (f"{TABLE}_counts_%",))}
+    insert_sql = triggers.get(f"{TABLE}_counts_ai", "")
+    if any(f"'{k}'" not in insert_sql or f"{TABLE}_counts_au_{k}" not in triggers for k in SUMMARY_COLUMNS):
+        return True
+    if not cur.execute(f"SELECT 1 FROM {TABLE} LIMIT 1").fetchone():
+        return False
+    have = {r[0] for r in cur.execute(f"SELECT DISTINCT col FROM {COUNTS_TABLE}")}
+    return any(k not in have for k in SUMMARY_COLUMNS)
+
+def drop_counts(cur):
+    names = [r[0] for r in cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE ?", (f"{TABLE}_counts_%",)).fetchall()]
+    for name in names:
+        cur.execute(f"DROP TRIGGER {name}")
+    cur.execute(f"DROP TABLE IF EXISTS {COUNTS_TABLE}")
+
+def rebuild_counts(cur):
+    cur.execute(f"DELETE FROM {COUNTS_TABLE}")
+    cur.execute(f"INSERT INTO {COUNTS_TABLE}(col, val, n) SELECT '*', '', COUNT(*) FROM {TABLE}")
+    for k in SUMMARY_COLUMNS:
+        cur.execute(f"""
+            INSERT INTO {COUNTS_TABLE}(col, val, n)
+            SELECT '{k}', coalesce({k}, ''), COUNT(*) FROM {TABLE} GROUP BY 2
+        """)
+
+def _tags_json(expr):
+    # SQL turning a "a, b, c" tags string into a JSON array for json_each(). Pure SQL
+    # (no CTEs, no Python functions) so it can run inside triggers. json_quote() escapes
+    # quotes, backslashes and control characters; commas never occur in its escapes.
+    return f"""'[' || replace(json_quote(coalesce({expr}, '')), ',', '","') || ']'"""
+
+def ensure_tags(cur):
+    exists = cur.execute("SELECT 1 FROM sqlite_master WHERE name=?", (TAGS_TABLE,)).fetchone()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TAGS_TABLE} (
+          contact_id INTEGER NOT NULL,
+          tag TEXT NOT NULL,
+          PRIMARY KEY (contact_id, tag)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS ix_{TAGS_TABLE}_tag ON {TAGS_TABLE}(tag, contact_id)")
+    split_new = f"SELECT new.id, trim(value) FROM json_each({_tags_json('new.tags')}) WHERE trim(value) <> ''"
+    cur.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_tags_ai AFTER INSERT ON {TABLE}
+        WHEN coalesce(new.tags, '') <> '' BEGIN
+          INSERT OR IGNORE INTO {TAGS_TABLE}(contact_id, tag) {split_new};
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_tags_au AFTER UPDATE OF tags ON {TABLE}
+        WHEN old.tags IS NOT new.tags BEGIN
+          DELETE FROM {TAGS_TABLE} WHERE contact_id = old.id;
+          INSERT OR IGNORE INTO {TAGS_TABLE}(contact_id, tag) {split_new};
+        END;
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_tags_ad AFTER DELETE ON {TABLE} BEGIN
+          DELETE FROM {TAGS_TABLE} WHERE contact_id = old.id;
+        END;
+    """)
+    if not exists:
+        cur.execute(f"""
+            INSERT OR IGNORE INTO {TAGS_TABLE}(contact_id, tag)
+            SELECT c.id, trim(j.value) FROM {TABLE} c, json_each({_tags_json('c.tags')}) j
+            WHERE coalesce(c.tags, '') <> '' AND trim(j.value) <> ''
+        """)
+
+def _like_escape(t):
+    return t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_clause(search_query):
+    # Returns (sql, params) restricting contacts to rows where every token occurs
+    # (case-insensitive substring) in at least one of SEARCH_COLUMNS.
+    #
+    # With FTS5, tokens of 3+ chars go through one trigram MATCH (index lookup).
+    # Trigram matching can't see 1-2 char tokens, so those use a plain LIKE scan; LIKE
+    # only folds ASCII case, so short tokens with other characters ("é") keep the
+    # like_nocase() scan. Without FTS5 every token uses like_nocase(). Both paths give
+    # the same rows (tests/test_search.py).
+    tokens = [t for t in (search_query or "").strip().split() if t]
+    where, params = [], []
+    if not tokens:
+        return "", params
+    if FTS_ENABLED:
+        long_t = [t for t in tokens if len(t) >= 3]
+        short_t = [t for t in tokens if len(t) < 3]
+        if long_t:
+            expr = " AND ".join(['"' + t.replace('"', '""') + '"' for t in long_t])
+            where.append(f"id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)")
+            params.append(expr)
+        for t in short_t:
+            if t.isascii():
+                where.append("(" + " OR ".join([f"{k} LIKE ? ESCAPE '\\'" for k in SEARCH_COLUMNS]) + ")")
+                params.extend([f"%{_like_escape(t)}%"]*len(SEARCH_COLUMNS))
+            else:
+                where.append("(" + " OR ".join([f"like_nocase({k}, ?)" for k in SEARCH_COLUMNS]) + ")")
+                params.extend([t]*len(SEARCH_COLUMNS))
+    else:
+        for t in tokens:
+            where.append("(" + " OR ".join([f"like_nocase({k}, ?)" for k in SEARCH_COLUMNS]) + ")")
+            params.extend([t]*len(SEARCH_COLUMNS))
+    return " AND ".join(where), params
+
+def build_where(filters=None, search_query=""):
     where = []
     params = []
     if filters:
         for k,v in filters.items():
             if not v: 
                 continue
-            if isinstance(v, (list,tuple)) and v:
+            if k in DATE_FILTERS:
+                col, op = DATE_FILTERS[k]
+                where.append(f"{col} {op} ?")
+                params.append(to_day(v) if isinstance(v, date) else normalize_date(v))
+            elif k == FOLLOW_UP_FILTER:
+                first, last = follow_up_days(v)
+                where.append("next_action_day <= ?")
+                params.append(last)
+                if first is not None:
+                    where.append("next_action_day >= ?")
+                    params.append(first)
+            elif k in TAG_FILTERS:
+                tags = [clean_tags(t).strip() for t in ([v] if isinstance(v, str) else v)]
+                place = ",".join(["?"]*len(tags))
+                sub = f"SELECT contact_id FROM {TAGS_TABLE} WHERE tag IN ({place})"
+                if k == "tag_all":
+                    sub += f" GROUP BY contact_id HAVING COUNT(*) = {len(set(tags))}"
+                where.append(f"id IN ({sub})")
+                params.extend(tags)
+            elif isinstance(v, (list,tuple)) and v:
                 place = ",".join(["?"]*len(v))
                 where.append(f"{k} IN ({place})")
                 params.extend(v)
@@ -79,117 +995,686 @@ def list_contacts(filters=None, search_query=""):
                 where.append(f"{k} = ?")
                 params.append(v)
     if search_query:
-        tokens = [t for t in search_query.strip().split() if t]
-        for t in tokens:
-            where.append("""(
-                like_nocase(full_name, ?) OR like_nocase(phone_number, ?) OR like_nocase(email_address, ?) OR
-                like_nocase(sponsor_name, ?) OR like_nocase(apl_go_id, ?) OR
-                like_nocase(city, ?) OR like_nocase(province, ?) OR like_nocase(country, ?) OR
-                like_nocase(interest_level, ?) OR like_nocase(tags, ?)
-            )""")
-            params.extend([t]*10)
+        sql, sparams = search_clause(search_query)
+        if sql:
+            where.append(sql)
+            params.extend(sparams)
+    return where, params
+
+# Columns list_contacts() can sort by (id is always the tie-breaker)
+SORT_COLUMNS = ["id"] + [k for k,_ in COLUMNS] + ["created_at", "updated_at"] + [c for c,_,_ in DATE_COLUMNS]
+
+def _keyset_clause(sort_by, descending, cursor):
+    # cursor = (sort_value, id) of the last row of the previous page.
+    # SQLite sorts NULL lowest, so NULLs come last in DESC order and first in ASC order.
+    if sort_by == "id":
+        return ("id < ?" if descending else "id > ?"), [cursor[1]]
+    val, rid = cursor
+    if descending:
+        if val is None:
+            return f"({sort_by} IS NULL AND id < ?)", [rid]
+        return f"({sort_by} < ? OR ({sort_by} = ? AND id < ?) OR {sort_by} IS NULL)", [val, val, rid]
+    if val is None:
+        return f"(({sort_by} IS NULL AND id > ?) OR {sort_by} IS NOT NULL)", [rid]
+    return f"({sort_by} > ? OR ({sort_by} = ? AND id > ?))", [val, val, rid]
+
+def _select_sql(filters=None, search_query="", limit=None, cursor=None, sort_by="id", descending=True, columns=None):
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort_by!r}")
+    where, params = build_where(filters, search_query)
+    if cursor is not None:
+        sql, kparams = _keyset_clause(sort_by, descending, cursor)
+        where.append(sql)
+        params.extend(kparams)
     where_sql = " WHERE " + " AND ".join(where) if where else ""
-    cur.execute(f"SELECT * FROM {TABLE}{where_sql} ORDER BY id DESC", params)
+    direction = "DESC" if descending else "ASC"
+    order_sql = f" ORDER BY id {direction}" if sort_by == "id" else f" ORDER BY {sort_by} {direction}, id {direction}"
+    limit_sql = ""
+    if limit:
+        limit_sql = " LIMIT ?"
+        params.append(int(limit))
+    cols = ", ".join(columns) if columns else "*"
+    return f"SELECT {cols} FROM {TABLE}{where_sql}{order_sql}{limit_sql}", params
+
+@traced
+def list_contacts(filters=None, search_query="", limit=None, cursor=None, sort_by="id", descending=True):
+    # Keyset pagination: pass limit for a page and next_cursor(rows) of the previous page as cursor.
+    ensure_schema()  # sets FTS_ENABLED, which _select_sql() reads
+    sql, params = _select_sql(filters, search_query, limit, cursor, sort_by, descending)
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params)
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
     return rows
 
-def unique_values(column):
+@traced
+def fetch_columns(filters=None, search_query="", columns=None, limit=None, cursor=None, sort_by="id", descending=True):
+    # list_contacts() as {column: tuple of values}, read straight off the cursor without a
+    # dict per row (for DataFrames, see to_frame). columns default to id + COLUMNS; id and
+    # sort_by are always included, so next_cursor() works on the result.
+    columns = list(columns or ["id"] + [k for k,_ in COLUMNS])
+    columns += [c for c in dict.fromkeys(["id", sort_by]) if c not in columns]
+    ensure_schema()  # sets FTS_ENABLED, which _select_sql() reads
+    sql, params = _select_sql(filters, search_query, limit, cursor, sort_by, descending, columns)
+    cur = get_conn().cursor()
+    cur.row_factory = None
+    rows = cur.execute(sql, params).fetchall()
+    return dict(zip(columns, zip(*rows))) if rows else {c: () for c in columns}
+
+@traced
+def explain(filters=None, search_query="", sort_by="id", descending=True, limit=None):
+    # Developer helper: EXPLAIN QUERY PLAN for the list_contacts() query, as indented
+    # lines such as "SEARCH contacts USING INDEX ix_contacts__city (city=?)".
+    ensure_schema()  # sets FTS_ENABLED, which _select_sql() reads
+    sql, params = _select_sql(filters, search_query, limit, None, sort_by, descending)
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in get_conn().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall():
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+def next_cursor(rows, sort_by="id"):
+    # rows from list_contacts(), or columns from fetch_columns()
+    if isinstance(rows, dict):
+        return (rows[sort_by][-1], rows["id"][-1]) if rows["id"] else None
+    if not rows:
+        return None
+    last = rows[-1]
+    return (last.get(sort_by), last["id"])
+
+@traced
+def count_contacts(filters=None, search_query=""):
     ensure_schema()
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(f"SELECT DISTINCT {column} AS v FROM {TABLE} WHERE {column} IS NOT NULL AND {column} <> '' ORDER BY 1 ASC")
-    vals = [r["v"] for r in cur.fetchall()]
-    conn.close()
-    return vals
+    where, params = build_where(filters, search_query)
+    where_sql = " WHERE " + " AND ".join(where) if where else ""
+    n = conn.execute(f"SELECT COUNT(*) FROM {TABLE}{where_sql}", params).fetchone()[0]
+    return n
 
-def upsert_many(rows):
+@traced
+def group_counts(columns=None):
+    # {column: {value: count}} for each column. SUMMARY_COLUMNS are served from the
+    # trigger-maintained COUNTS_TABLE; any other columns are counted together in one
+    # GROUP BY pass over contacts and rolled up here.
+    columns = list(columns or SUMMARY_COLUMNS)
     ensure_schema()
-    if not rows:
-        return 0
     conn = get_conn()
-    cur = conn.cursor()
+    out = {k: {} for k in columns}
+    cached = [k for k in columns if k in SUMMARY_COLUMNS]
+    if cached:
+        place = ",".join(["?"]*len(cached))
+        for r in conn.execute(f"SELECT col, val, n FROM {COUNTS_TABLE} WHERE col IN ({place}) AND n > 0", cached):
+            out[r["col"]][r["val"]] = r["n"]
+    rest = [k for k in columns if k not in SUMMARY_COLUMNS]
+    if rest:
+        sel = ", ".join([f"coalesce({k}, '')" for k in rest])
+        for r in conn.execute(f"SELECT {sel}, COUNT(*) FROM {TABLE} GROUP BY {sel}"):
+            for i, k in enumerate(rest):
+                out[k][r[i]] = out[k].get(r[i], 0) + r[len(rest)]
+    return out
+
+@traced
+def total_contacts():
+    ensure_schema()
+    conn = get_conn()
+    row = conn.execute(f"SELECT n FROM {COUNTS_TABLE} WHERE col = '*' AND val = ''").fetchone()
+    return row["n"] if row else 0
+
+# Follow-up windows on next_action: name -> (first, last) day offset from today, None = open
+FOLLOW_UP_WINDOWS = {"overdue": (None, -1), "today": (0, 0), "upcoming": (1, 7), "due": (None, 0)}
+
+def follow_up_days(window, today=None):
+    # (first, last) YYYYMMDD days of a FOLLOW_UP_WINDOWS entry; first is None for open-ended
+    if window not in FOLLOW_UP_WINDOWS:
+        raise ValueError(f"Unknown follow-up window {window!r}")
+    lo, hi = FOLLOW_UP_WINDOWS[window]
+    today = today or date.today()
+    return (None if lo is None else to_day(today + timedelta(days=lo))), to_day(today + timedelta(days=hi))
+
+def follow_up_filters(window, today=None):
+    # DATE_FILTERS for a FOLLOW_UP_WINDOWS entry as of today, as ISO strings. These are
+    # fixed dates; filters that should move with the date use FOLLOW_UP_FILTER.
+    lo, hi = FOLLOW_UP_WINDOWS[window]
+    today = today or date.today()
+    out = {"next_action_to": (today + timedelta(days=hi)).isoformat()}
+    if lo is not None:
+        out["next_action_from"] = (today + timedelta(days=lo)).isoformat()
+    return out
+
+@traced
+def follow_up_counts(filters=None, today=None):
+    # {"overdue", "today", "upcoming"} in one range scan of the next_action_day index
+    ensure_schema()
+    today = today or date.today()
+    t, last = to_day(today), to_day(today + timedelta(days=FOLLOW_UP_WINDOWS["upcoming"][1]))
+    where, params = build_where(filters)
+    where_sql = "".join(f" AND {w}" for w in where)
+    row = get_conn().execute(f"""
+        SELECT coalesce(SUM(next_action_day < ?), 0), coalesce(SUM(next_action_day = ?), 0),
+               coalesce(SUM(next_action_day > ?), 0)
+        FROM {TABLE} WHERE next_action_day <= ?{where_sql}
+    """, [t, t, t, last] + params).fetchone()
+    return {"overdue": row[0], "today": row[1], "upcoming": row[2]}
+
+def next_actions(window="due", filters=None, limit=50, cursor=None, today=None):
+    # Contacts whose next action falls in a FOLLOW_UP_WINDOWS window, oldest date first
+    # (keyset paging as in list_contacts; next_cursor(rows, "next_action_day"))
+    f = dict(filters or {})
+    f.update(follow_up_filters(window, today))
+    return list_contacts(f, limit=limit, cursor=cursor, sort_by="next_action_day", descending=False)
+
+@traced
+def data_version():
+    # Changes whenever contacts are inserted, updated or deleted (by any connection)
+    ensure_schema()
+    row = get_conn().execute(f"SELECT value FROM {META_TABLE} WHERE key = 'contacts_version'").fetchone()
+    return row[0] if row else 0
+
+_facet_cache = {}   # (db path, columns) -> (data_version, result)
+
+@traced
+def facets(columns):
+    # {column: [(value, count), ...]} sorted by value, blanks left out. "tags" gives
+    # per-tag counts. Cached in-process until data_version() changes.
+    columns = tuple(columns)
+    key = (str(DB_PATH), columns)
+    version = data_version()
+    hit = _facet_cache.get(key)
+    if hit and hit[0] == version:
+        return hit[1]
+    out = {}
+    cols = [c for c in columns if c != "tags"]
+    counts = group_counts(cols) if cols else {}
+    for c in columns:
+        vals = dict(tag_counts()) if c == "tags" else counts[c]
+        out[c] = sorted([(v, n) for v, n in vals.items() if v != ""])
+    _facet_cache[key] = (version, out)
+    return out
+
+def unique_values(column):
+    return [v for v, _ in facets([column])[column]]
+
+# Low-cardinality columns that to_frame() stores as pandas categoricals
+CATEGORY_COLUMNS = [
+    "state", "country", "province", "city", "interest_level", "assigned_to", "lead_temperature",
+    "communication_status", "sponsor_name", "lead_type", "associate_status", "registration_status",
+]
+
+def to_frame(data, categorical=True):
+    # fetch_columns() output -> DataFrame. With categorical=True, CATEGORY_COLUMNS hold one
+    # copy of each distinct value plus small integer codes instead of a string object per row.
+    # Pass categorical=False for frames that go into st.data_editor (categoricals become
+    # dropdowns limited to the existing values).
+    import pandas as pd      # deferred, like the pages that use it
+    cols = {}
+    for c, vals in data.items():
+        cols[c] = pd.Categorical(vals) if categorical and c in CATEGORY_COLUMNS else list(vals)
+    return pd.DataFrame(cols)
+
+_snapshot_cache = {}   # (db path, columns) -> (data_version, DataFrame)
+
+def snapshot(columns=None):
+    # The whole contacts table (id + COLUMNS by default) as a categorical to_frame(), newest
+    # first; cached in-process until data_version() changes. Shared: don't modify it in place.
+    columns = tuple(columns or ["id"] + [k for k,_ in COLUMNS])
+    key = (str(DB_PATH), columns)
+    version = data_version()
+    hit = _snapshot_cache.get(key)
+    if hit and hit[0] == version:
+        return hit[1]
+    df = to_frame(fetch_columns(columns=columns))
+    _snapshot_cache[key] = (version, df)
+    return df
+
+def _upsert_sql(policy):
+    keys = [k for k,_ in COLUMNS]
+    cols = keys + [key for key,_,_ in SHADOW_COLUMNS]
+    sql = f"INSERT INTO {TABLE} ({','.join(cols)}) VALUES ({','.join(['?']*len(cols))})"
+    if policy == "skip":
+        return sql + " ON CONFLICT DO NOTHING"
+    # overwrite: non-blank incoming values win; fill_blanks: only empty fields are filled.
+    # Shadow columns follow their source column so they stay consistent.
+    if policy == "overwrite":
+        expr = "CASE WHEN coalesce(excluded.{src}, '') <> '' THEN excluded.{c} ELSE {c} END"
+    else:
+        expr = "CASE WHEN coalesce({src}, '') = '' AND coalesce(excluded.{src}, '') <> '' THEN excluded.{c} ELSE {c} END"
+    new = {k: expr.format(src=k, c=k) for k in keys}
+    new.update({key: expr.format(src=src, c=key) for key, src, _ in SHADOW_COLUMNS})
+    sets = ", ".join([f"{c} = {e}" for c, e in new.items()])
+    # only touch rows that actually change, so re-imports don't rewrite every row
+    changed = " OR ".join([f"({new[k]}) IS NOT {k}" for k in keys])
+    update = f"DO UPDATE SET {sets}, updated_at = datetime('now') WHERE {changed}"
+    return f"{sql} ON CONFLICT(apl_key) {update} ON CONFLICT(phone_key) {update}"
+
+@traced
+def upsert_many(rows, policy="overwrite"):
+    # rows: dicts keyed by column, or tuples/lists in COLUMNS order (bulk import path).
+    # Rows matching an existing contact by APL Go ID, then by normalized phone, are merged
+    # according to policy (see UPSERT_POLICIES). Returns {"inserted", "updated", "skipped"}.
+    if policy not in UPSERT_POLICIES:
+        raise ValueError(f"Unknown upsert policy {policy!r}")
+    ensure_schema()
+    summary = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not rows:
+        return summary
     keys = [k for k,_ in COLUMNS]
-    q = ",".join(["?"]*len(keys))
-    sql = f"INSERT INTO {TABLE} ({','.join(keys)}) VALUES ({q})"
+    shadows = [(keys.index(src), NORMALIZERS[fn]) for _, src, fn in SHADOW_COLUMNS]
+    tags_i = keys.index("tags")
+    sql = _upsert_sql(policy)
     data = []
     for r in rows:
-        data.append([r.get(k,"") for k in keys])
-    cur.executemany(sql, data)
-    conn.commit()
-    n = cur.rowcount
-    conn.close()
-    return n
+        vals = list(r) if isinstance(r, (list,tuple)) else [r.get(k,"") for k in keys]
+        vals[tags_i] = clean_tags(vals[tags_i])
+        data.append(vals + [fn(vals[i]) for i, fn in shadows])
+
+    rowwise = []
+
+    def op(conn):
+        cur = conn.cursor()
+        last_id = conn.execute(f"SELECT coalesce(MAX(id), 0) FROM {TABLE}").fetchone()[0]
+        if not rowwise:
+            try:
+                cur.executemany(sql, data)
+                changed = cur.rowcount
+            except sqlite3.IntegrityError:
+                # a row matched one contact by APL Go ID and a different one by phone:
+                # roll back and retry row by row, skipping the conflicting rows
+                rowwise.append(True)
+                raise _Rerun()
+        else:
+            changed = 0
+            for vals in data:
+                try:
+                    cur.execute(sql, vals)
+                    changed += cur.rowcount
+                except sqlite3.IntegrityError:
+                    pass
+        inserted = conn.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE id > ?", (last_id,)).fetchone()[0]
+        return {"inserted": inserted, "updated": changed - inserted, "skipped": len(data) - changed}
+    return _write(op)
 
-def insert_one(row):
-    return upsert_many([row])
+def insert_one(row, policy="overwrite"):
+    return upsert_many([row], policy=policy)
 
+@traced
 def update_rows(rows):
+    # rows: [{"id": ..., column: value, ...}] carrying only the columns to change.
+    # Rows are grouped by column set into one executemany each, all in one transaction;
+    # rows whose stored values already match are skipped, so updated_at stays meaningful.
     ensure_schema()
     if not rows: return 0
-    conn = get_conn()
-    cur = conn.cursor()
     keys = [k for k,_ in COLUMNS]
-    count = 0
+    groups = {}
     for r in rows:
         rid = r.get("id")
         if not rid: 
             continue
-        fields = [k for k in keys if k in r]
+        fields = tuple(k for k in keys if k in r)
         if not fields:
             continue
-        set_clause = ", ".join([f"{k}=?" for k in fields])
-        params = [r.get(k,"") for k in fields] + [rid]
-        cur.execute(f"UPDATE {TABLE} SET {set_clause}, updated_at=datetime('now') WHERE id=?", params)
-        count += cur.rowcount
-    conn.commit()
-    conn.close()
-    return count
+        vals = [clean_tags(r.get(k,"")) if k == "tags" else r.get(k,"") for k in fields]
+        key_vals = [r.get(src,"") for _, src, _ in SHADOW_COLUMNS if src in fields]
+        groups.setdefault(fields, []).append(vals + key_vals + [rid] + vals)
+    def op(conn):
+        cur = conn.cursor()
+        count = 0
+        for fields, params in groups.items():
+            set_clause = ", ".join([f"{k}=?" for k in fields])
+            for key, src, fn in SHADOW_COLUMNS:
+                if src in fields:
+                    set_clause += f", {key}={fn}(?)"
+            changed = " OR ".join([f"{k} IS NOT ?" for k in fields])
+            cur.executemany(f"UPDATE {TABLE} SET {set_clause}, updated_at=datetime('now') WHERE id=? AND ({changed})", params)
+            count += cur.rowcount
+        return count
+    return _write(op)
 
+@traced
 def update_tags(ids, add_tags=None, remove_tags=None):
+    # Set-based: edits TAGS_TABLE for all ids at once, then rebuilds the sorted
+    # "a, b" tags string only on contacts whose tags actually changed.
+    ensure_schema()
+    add = sorted({clean_tags(t).strip() for t in (add_tags or []) if clean_tags(t).strip()})
+    rem = sorted({clean_tags(t).strip() for t in (remove_tags or []) if clean_tags(t).strip()})
+    ids = json.dumps([int(i) for i in ids])
+    joined = f"""coalesce((SELECT group_concat(tag, ', ') FROM (
+        SELECT tag FROM {TAGS_TABLE} WHERE contact_id = {TABLE}.id ORDER BY tag)), '')"""
+    def op(conn):
+        cur = conn.cursor()
+        if add:
+            cur.execute(f"""
+                INSERT OR IGNORE INTO {TAGS_TABLE}(contact_id, tag)
+                SELECT c.id, t.value FROM {TABLE} c, json_each(?) t
+                WHERE c.id IN (SELECT value FROM json_each(?))
+            """, (json.dumps(add), ids))
+        if rem:
+            cur.execute(f"""
+                DELETE FROM {TAGS_TABLE}
+                WHERE contact_id IN (SELECT value FROM json_each(?)) AND tag IN (SELECT value FROM json_each(?))
+            """, (ids, json.dumps(rem)))
+        cur.execute(f"""
+            UPDATE {TABLE} SET tags = {joined}, updated_at = datetime('now')
+            WHERE id IN (SELECT value FROM json_each(?)) AND coalesce(tags, '') <> {joined}
+        """, (ids,))
+        return cur.rowcount
+    return _write(op)
+
+@traced
+def tag_counts():
+    # [(tag, number of contacts)], most used first
     ensure_schema()
     conn = get_conn()
-    cur = conn.cursor()
-    for rid in ids:
-        row = cur.execute(f"SELECT tags FROM {TABLE} WHERE id=?", (rid,)).fetchone()
-        current = set()
-        if row and row["tags"]:
-            current = {t.strip() for t in str(row["tags"]).split(",") if t.strip()}
-        if add_tags:
-            for t in add_tags:
-                if t.strip(): current.add(t.strip())
-        if remove_tags:
-            for t in remove_tags:
-                current.discard(t.strip())
-        newv = ", ".join(sorted(current))
-        cur.execute(f"UPDATE {TABLE} SET tags=?, updated_at=datetime('now') WHERE id=?", (newv, rid))
-    conn.commit()
-    conn.close()
+    return [(r[0], r[1]) for r in conn.execute(
+        f"SELECT tag, COUNT(*) FROM {TAGS_TABLE} GROUP BY tag ORDER BY 2 DESC, 1")]
+
+EXPORT_BATCH = 2000
+
+def iter_contacts(filters=None, search_query="", columns=None, batch_size=EXPORT_BATCH):
+    # Yields lists of row tuples (newest first) via fetchmany, so callers can stream
+    # any size of result without holding it all in memory.
+    ensure_schema()
+    conn = get_conn()
+    where, params = build_where(filters, search_query)
+    where_sql = " WHERE " + " AND ".join(where) if where else ""
+    cols = ", ".join(columns or [k for k,_ in COLUMNS])
+    cur = conn.execute(f"SELECT {cols} FROM {TABLE}{where_sql} ORDER BY id DESC", params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [tuple(r) for r in rows]
 
+@traced
 def export_all():
     ensure_schema()
     conn = get_conn()
     cur = conn.cursor()
     cur.execute(f"SELECT * FROM {TABLE} ORDER BY id DESC")
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
     return rows
 
-# Saved segments (simple JSON file)
+# -------- Saved segments --------
+SEGMENT_FILTER_KEYS = ["id"] + [k for k,_ in COLUMNS] + TAG_FILTERS + list(DATE_FILTERS) + [FOLLOW_UP_FILTER]
+
+def compile_segment(filters):
+    # -> (where_sql, params) using the same rules as list_contacts() filters
+    bad = [k for k in (filters or {}) if k not in SEGMENT_FILTER_KEYS]
+    if bad:
+        raise ValueError(f"Unknown segment filter(s): {', '.join(bad)}")
+    where, params = build_where(filters)
+    if any(p is not None and not isinstance(p, (str, int, float)) for p in params):
+        raise ValueError("Segment filter values must be text, numbers or lists of them")
+    return (" AND ".join(where) or "1"), params
+
+def _store_segment(cur, name, filters):
+    where_sql, params = compile_segment(filters)
+    cur.execute(f"""
+        INSERT INTO {SEGMENTS_TABLE}(name, filters, where_sql, params) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET filters = excluded.filters, where_sql = excluded.where_sql,
+          params = excluded.params, synced_seq = -1, updated_at = datetime('now')
+    """, (name, json.dumps(filters), where_sql, json.dumps(params)))
+
+def _change_seq(conn):
+    # Last sequence number handed out by CHANGES_TABLE (survives compaction)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (CHANGES_TABLE,)).fetchone()
+    return row[0] if row else 0
+
+def _changes_floor(conn):
+    row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'changes_floor'").fetchone()
+    return row[0] if row else 0
+
+def _moved_segments(conn):
+    # Segments using FOLLOW_UP_FILTER whose compiled params no longer match today's date:
+    # [(where_sql, params json, id)] to store (they are then rebuilt, as membership moved
+    # without any contact changing)
+    out = []
+    for r in conn.execute(f"SELECT id, filters, params FROM {SEGMENTS_TABLE} WHERE filters LIKE ?",
+                          (f'%"{FOLLOW_UP_FILTER}"%',)):
+        filters = json.loads(r["filters"])
+        if FOLLOW_UP_FILTER in filters:
+            where_sql, params = compile_segment(filters)
+            if json.dumps(params) != r["params"]:
+                out.append((where_sql, json.dumps(params), r["id"]))
+    return out
+
 def load_segments():
-    if not SEGMENTS_PATH.exists(): return {}
-    try:
-        return json.loads(SEGMENTS_PATH.read_text(encoding='utf-8'))
-    except Exception:
-        return {}
+    # {name: filters}, sorted by name
+    ensure_schema()
+    rows = get_conn().execute(f"SELECT name, filters FROM {SEGMENTS_TABLE} ORDER BY name").fetchall()
+    return {r["name"]: json.loads(r["filters"]) for r in rows}
 
 def save_segment(name, filters):
-    segs = load_segments()
-    segs[name] = filters
-    SEGMENTS_PATH.write_text(json.dumps(segs, indent=2), encoding='utf-8')
+    ensure_schema()
+    compile_segment(filters)    # raise bad filters here, not on the writer thread
+    _write(lambda conn: _store_segment(conn.cursor(), name, filters))
 
 def delete_segment(name):
-    segs = load_segments()
-    if name in segs:
-        del segs[name]
-        SEGMENTS_PATH.write_text(json.dumps(segs, indent=2), encoding='utf-8')
+    ensure_schema()
+    def op(conn):
+        conn.execute(f"""DELETE FROM {SEGMENT_MEMBERS_TABLE}
+                         WHERE segment_id = (SELECT id FROM {SEGMENTS_TABLE} WHERE name = ?)""", (name,))
+        conn.execute(f"DELETE FROM {SEGMENTS_TABLE} WHERE name = ?", (name,))
+    _write(op)
+
+@traced
+def refresh_segments():
+    # Brings every segment's member ids/count up to the latest contact change. Segments
+    # that are new, edited or far behind are rebuilt from their compiled SQL; otherwise
+    # only contacts changed since the last refresh are re-checked.
+    ensure_schema()
+    conn = get_conn()
+    moved = _moved_segments(conn)
+    if moved:
+        _write(lambda conn: conn.executemany(
+            f"UPDATE {SEGMENTS_TABLE} SET where_sql = ?, params = ?, synced_seq = -1 WHERE id = ?", moved))
+    seq = _change_seq(conn)
+    if not conn.execute(f"SELECT 1 FROM {SEGMENTS_TABLE} WHERE synced_seq < ? LIMIT 1", (seq,)).fetchone():
+        compact_changes()
+        return 0
+    def op(conn):
+        cur = conn.cursor()
+        seq = _change_seq(conn)
+        floor = _changes_floor(conn)
+        stale = conn.execute(f"SELECT id, where_sql, params, synced_seq FROM {SEGMENTS_TABLE} WHERE synced_seq < ?",
+                             (seq,)).fetchall()
+        for seg in stale:
+            sid, where_sql, params = seg["id"], seg["where_sql"], json.loads(seg["params"])
+            changed = 0
+            if seg["synced_seq"] >= 0:
+                changed = conn.execute(f"SELECT COUNT(DISTINCT contact_id) FROM {CHANGES_TABLE} WHERE seq > ?",
+                                       (seg["synced_seq"],)).fetchone()[0]
+            if seg["synced_seq"] < floor or changed > SEGMENT_FULL_REFRESH:
+                cur.execute(f"DELETE FROM {SEGMENT_MEMBERS_TABLE} WHERE segment_id = ?", (sid,))
+                cur.execute(f"INSERT INTO {SEGMENT_MEMBERS_TABLE}(segment_id, contact_id) "
+                            f"SELECT ?, id FROM {TABLE} WHERE {where_sql}", [sid] + params)
+            else:
+                touched = f"SELECT contact_id FROM {CHANGES_TABLE} WHERE seq > ?"
+                cur.execute(f"DELETE FROM {SEGMENT_MEMBERS_TABLE} WHERE segment_id = ? AND contact_id IN ({touched})",
+                            (sid, seg["synced_seq"]))
+                cur.execute(f"INSERT INTO {SEGMENT_MEMBERS_TABLE}(segment_id, contact_id) "
+                            f"SELECT ?, id FROM {TABLE} WHERE id IN ({touched}) AND ({where_sql})",
+                            [sid, seg["synced_seq"]] + params)
+            cur.execute(f"""
+                UPDATE {SEGMENTS_TABLE} SET synced_seq = ?,
+                  member_count = (SELECT COUNT(*) FROM {SEGMENT_MEMBERS_TABLE} WHERE segment_id = ?)
+                WHERE id = ?
+            """, (seq, sid, sid))
+        return len(stale)
+    n = _write(op)
+    compact_changes()
+    return n
+
+def _compaction_point(conn):
+    # -> seq to compact up to, or None when there is nothing to drop
+    head = _change_seq(conn)
+    low = conn.execute(f"""
+        SELECT MIN(s) FROM (SELECT synced_seq AS s FROM {SEGMENTS_TABLE}
+                            UNION ALL SELECT value FROM {META_TABLE} WHERE key LIKE ?)
+    """, (CONSUMER_PREFIX + "%",)).fetchone()[0]
+    low = min(head if low is None else low, head - CHANGES_RETAIN)
+    low = max(low, head - CHANGES_MAX)
+    return low if low > _changes_floor(conn) else None
+
+def compact_changes():
+    # Drops change-log entries that every consumer (segments, registered sync consumers)
+    # has processed, except the last CHANGES_RETAIN; never keeps more than CHANGES_MAX.
+    ensure_schema()
+    if _compaction_point(get_conn()) is None:
+        return      # checked on a read connection first: no write lock on every page view
+    def op(conn):
+        low = _compaction_point(conn)
+        if low is not None:
+            conn.execute(f"DELETE FROM {CHANGES_TABLE} WHERE seq <= ?", (low,))
+            conn.execute(f"UPDATE {META_TABLE} SET value = ? WHERE key = 'changes_floor'", (low,))
+    _write(op)
+
+def segment_counts():
+    # {name: member count}, refreshed first (cheap when nothing changed)
+    refresh_segments()
+    rows = get_conn().execute(f"SELECT name, member_count FROM {SEGMENTS_TABLE} ORDER BY name").fetchall()
+    return {r["name"]: r["member_count"] for r in rows}
+
+def segment_member_ids(name):
+    refresh_segments()
+    return [r[0] for r in get_conn().execute(
+        f"""SELECT contact_id FROM {SEGMENT_MEMBERS_TABLE}
+            WHERE segment_id = (SELECT id FROM {SEGMENTS_TABLE} WHERE name = ?) ORDER BY contact_id DESC""", (name,))]
+
+# -------- Change log / delta export --------
+# Columns of export_since() rows: change seq, op ('U' = row inserted or updated, 'D' = deleted),
+# contact id, then the contact as it is now (all None for deletions)
+DELTA_COLUMNS = ["change_seq", "change_op", "id"] + [k for k,_ in COLUMNS] + ["created_at", "updated_at"]
+
+class ChangeLogCompacted(Exception):
+    # export_since() was asked for changes that compact_changes() already dropped;
+    # the consumer has to start again from a full copy (see change_head())
+    pass
+
+def change_head():
+    # Last change seq; a full copy taken after reading it plus export_since(head) is complete
+    ensure_schema()
+    return _change_seq(get_conn())
+
+def export_since(seq, upto=None, batch_size=EXPORT_BATCH):
+    # Contacts changed after change seq `seq` (up to `upto`, default the current head), once
+    # each with their latest state, as batches of DELTA_COLUMNS tuples in change order.
+    # The seq of the last row applied is a resumable cursor. Raises ChangeLogCompacted
+    # when the log no longer reaches back to `seq`.
+    ensure_schema()
+    conn = get_conn()
+    floor = _changes_floor(conn)
+    if seq < floor:
+        raise ChangeLogCompacted(f"Changes up to #{floor} were compacted; cannot export since #{seq}")
+    upto = _change_seq(conn) if upto is None else upto
+    return _iter_delta(conn, seq, upto, batch_size)
+
+def _iter_delta(conn, seq, upto, batch_size):
+    cols = ", ".join(f"c.{k}" for k in DELTA_COLUMNS[3:])
+    cur = conn.execute(f"""
+        SELECT ch.seq, CASE WHEN c.id IS NULL THEN 'D' ELSE 'U' END, ch.contact_id, {cols}
+        FROM (SELECT contact_id, MAX(seq) AS seq FROM {CHANGES_TABLE}
+              WHERE seq > ? AND seq <= ? GROUP BY contact_id) ch
+        LEFT JOIN {TABLE} c ON c.id = ch.contact_id
+        ORDER BY ch.seq
+    """, (seq, upto))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [tuple(r) for r in rows]
+
+def ack_changes(consumer, seq):
+    # Registers `consumer` as having applied every change up to seq; compaction keeps
+    # the log from there on (up to CHANGES_MAX) until drop_consumer()
+    ensure_schema()
+    _write(lambda conn: conn.execute(f"""INSERT INTO {META_TABLE}(key, value) VALUES (?, ?)
+                         ON CONFLICT(key) DO UPDATE SET value = excluded.value""", (CONSUMER_PREFIX + consumer, seq)))
+
+def drop_consumer(consumer):
+    ensure_schema()
+    _write(lambda conn: conn.execute(f"DELETE FROM {META_TABLE} WHERE key = ?", (CONSUMER_PREFIX + consumer,)))
+
+def change_consumers():
+    # {consumer: last acknowledged seq}
+    ensure_schema()
+    rows = get_conn().execute(f"SELECT key, value FROM {META_TABLE} WHERE key LIKE ? ORDER BY key",
+                              (CONSUMER_PREFIX + "%",)).fetchall()
+    return {r[0][len(CONSUMER_PREFIX):]: r[1] for r in rows}
+
+# -------- Duplicates --------
+def save_duplicates(pairs):
+    # Replaces DUPLICATES_TABLE with [(score, a, b)] from dedupe.find_duplicates()
+    ensure_schema()
+    def op(conn):
+        conn.execute(f"DELETE FROM {DUPLICATES_TABLE}")
+        conn.executemany(f"INSERT OR REPLACE INTO {DUPLICATES_TABLE}(score, a, b) VALUES (?, ?, ?)", pairs)
+    _write(op)
+
+@traced
+def list_duplicates(min_score=0.0, limit=100):
+    # Best pairs first, with the fields the duplicate review shows for both contacts
+    ensure_schema()
+    shown = ["full_name", "phone_number", "email_address", "apl_go_id", "city"]
+    cols = ", ".join(f"{t}.{k} AS {t}_{k}" for t in ("ca", "cb") for k in shown)
+    rows = get_conn().execute(f"""
+        SELECT d.score, d.a, d.b, {cols} FROM {DUPLICATES_TABLE} d
+        JOIN {TABLE} ca ON ca.id = d.a JOIN {TABLE} cb ON cb.id = d.b
+        WHERE d.score >= ? ORDER BY d.score DESC, d.a, d.b LIMIT ?
+    """, (min_score, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+@traced
+def count_duplicates(min_score=0.0):
+    ensure_schema()
+    return get_conn().execute(f"SELECT COUNT(*) FROM {DUPLICATES_TABLE} WHERE score >= ?", (min_score,)).fetchone()[0]
+
+def duplicate_pairs(min_score=0.0):
+    # [(a, b)] above min_score, for dedupe.clusters()
+    ensure_schema()
+    return [(r[0], r[1]) for r in get_conn().execute(
+        f"SELECT a, b FROM {DUPLICATES_TABLE} WHERE score >= ?", (min_score,))]
+
+@traced
+def merge_contacts(groups):
+    # groups: lists of contact ids that are the same person. Per group the most complete
+    # contact (most non-blank fields, then the oldest) is kept: its blank fields are filled
+    # from the others (most complete first), tags are combined, and the others are deleted.
+    # All groups are merged in one transaction; a group whose merged APL Go ID / phone
+    # belongs to a contact outside the group is skipped.
+    # Returns {"merged": groups merged, "removed": contacts deleted, "skipped": groups skipped}.
+    ensure_schema()
+    keys = [k for k,_ in COLUMNS]
+    sets = ", ".join([f"{k}=?" for k in keys] + [f"{key}={fn}(?)" for key, _, fn in SHADOW_COLUMNS])
+    def op(conn):
+        res = {"merged": 0, "removed": 0, "skipped": 0}
+        for ids in groups:
+            ids = sorted({int(i) for i in ids})
+            place = ",".join(["?"]*len(ids))
+            rows = [dict(r) for r in conn.execute(f"SELECT id, {', '.join(keys)} FROM {TABLE} WHERE id IN ({place})", ids)]
+            if len(rows) < 2:
+                continue
+            rows.sort(key=lambda r: (-sum(1 for k in keys if str(r[k] or "").strip()), r["id"]))
+            keep, rest = rows[0], rows[1:]
+            merged = {k: keep[k] for k in keys}
+            for r in rest:
+                for k in keys:
+                    if not str(merged[k] or "").strip() and str(r[k] or "").strip():
+                        merged[k] = r[k]
+            merged["tags"] = ", ".join(sorted({t.strip() for r in rows for t in (r["tags"] or "").split(",") if t.strip()}))
+            gone = [r["id"] for r in rest]
+            conn.execute("SAVEPOINT merge")
+            try:
+                conn.execute(f"DELETE FROM {TABLE} WHERE id IN ({','.join(['?']*len(gone))})", gone)
+                conn.execute(f"UPDATE {TABLE} SET {sets}, updated_at=datetime('now') WHERE id=?",
+                             [merged[k] for k in keys] + [merged[src] for _, src, _ in SHADOW_COLUMNS] + [keep["id"]])
+            except sqlite3.IntegrityError:
+                conn.execute("ROLLBACK TO merge")
+                res["skipped"] += 1
+            else:
+                conn.execute(f"DELETE FROM {DUPLICATES_TABLE} WHERE a IN ({place}) OR b IN ({place})", ids + ids)
+                res["merged"] += 1
+                res["removed"] += len(gone)
+            conn.execute("RELEASE merge")
+        return res
+    return _write(op)
@@ -0,0 +1,163 @@
+# dedupe.py — fuzzy duplicate finder for contacts
+#
+# Scoring every pair of contacts is quadratic, so contacts are first grouped into blocks
+# that duplicates are likely to share, and only pairs inside a block are scored:
+#   p:<last 9 phone digits>   "+27 82 555 1234", "082 555 1234" and "82 555 1234" meet
+#   a:<APL Go ID>, e:<email>
+#   n:<first trigram of the first name token>|<initial of the last token>, in both token
+#     orders, so "Thabo M", "Thabo Mokoena" and "Mokoena Thabo" meet
+# Blocks bigger than MAX_BLOCK (common names) are sorted by phone and each contact is only
+# compared with the next WINDOW ones, which keeps the work linear in the number of contacts
+# (near-identical phone numbers, e.g. one mistyped digit, end up next to each other).
+# Pairs are scored on name trigram similarity, phone, email and APL Go ID; see score().
+import re, unicodedata
+from functools import lru_cache
+
+import db
+
+MAX_BLOCK = 32
+WINDOW = 8
+MIN_SCORE = 0.75
+# Field weights; fields blank on either side are left out of the average
+WEIGHTS = {"name": 0.4, "phone": 0.3, "email": 0.15, "apl": 0.15}
+# A pair that can only be compared on the name scores at most this
+NAME_ONLY_CAP = 0.7
+FETCH_COLUMNS = ["id", "full_name", "phone_number", "email_address", "apl_go_id"]
+
+@lru_cache(maxsize=65536)
+def name_tokens(name):
+    # "Thabo  MOKOENA-Ndlovu" -> ("thabo", "mokoena", "ndlovu"); accents dropped
+    s = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    return tuple(re.findall(r"[a-z]+", s))
+
+@lru_cache(maxsize=65536)
+def trigrams(tokens):
+    s = " " + " ".join(tokens) + " "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+@lru_cache(maxsize=65536)
+def phone_tail(phone):
+    # Last 9 digits: the subscriber number without country code / trunk 0
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-9:] if len(digits) >= 9 else None
+
+def features(full_name, phone, email, apl):
+    return (name_tokens(full_name), phone_tail(phone), (email or "").strip().lower() or None,
+            db.normalize_apl_id(apl))
+
+def block_keys(f):
+    tokens, tail, email, apl = f
+    keys = []
+    if tail:
+        keys.append("p:" + tail)
+    if apl:
+        keys.append("a:" + apl)
+    if email:
+        keys.append("e:" + email)
+    if tokens:
+        keys.append(f"n:{tokens[0][:3]}|{tokens[-1][0]}")
+        if len(tokens) > 1:
+            keys.append(f"n:{tokens[-1][:3]}|{tokens[0][0]}")
+    return keys
+
+def name_similarity(a, b):
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    # "thabo m" vs "thabo mokoena": every token a prefix of its counterpart
+    if len(a) == len(b) and all(x.startswith(y) or y.startswith(x) for x, y in zip(a, b)):
+        return 0.9
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb)
+
+def phone_similarity(a, b):
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    diff = [i for i in range(9) if a[i] != b[i]]
+    if len(diff) == 1:
+        return 0.8            # one mistyped digit
+    if len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]:
+        return 0.8            # two digits swapped
+    return 0.0
+
+def _exact(a, b):
+    return None if not a or not b else float(a == b)
+
+def score(fa, fb):
+    # -> 0..1, weighted over the fields both contacts have
+    sims = {
+        "name": name_similarity(fa[0], fb[0]),
+        "phone": phone_similarity(fa[1], fb[1]),
+        "email": _exact(fa[2], fb[2]),
+        "apl": _exact(fa[3], fb[3]),
+    }
+    total = weight = 0.0
+    for k, s in sims.items():
+        if s is not None:
+            total += WEIGHTS[k] * s
+            weight += WEIGHTS[k]
+    if not weight:
+        return 0.0
+    res = total / weight
+    if weight == WEIGHTS["name"]:
+        res = min(res, NAME_ONLY_CAP)
+    return res
+
+def _candidate_pairs(members, feats):
+    # members: contact ids sharing a block key
+    if len(members) <= MAX_BLOCK:
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                yield a, b
+        return
+    members = sorted(members, key=lambda cid: (feats[cid][1] or "", cid))
+    for i, a in enumerate(members):
+        for b in members[i + 1:i + 1 + WINDOW]:
+            yield a, b
+
+def find_duplicates(min_score=MIN_SCORE, progress=None):
+    # -> [(score, id_a, id_b)] with id_a < id_b, best first. progress(done, total) is
+    # called while contacts are read and blocks are scored (it may raise to cancel).
+    feats, blocks = {}, {}
+    total = db.total_contacts()
+    for rows in db.iter_contacts(columns=FETCH_COLUMNS):
+        for cid, name, phone, email, apl in rows:
+            f = feats[cid] = features(name, phone, email, apl)
+            for k in block_keys(f):
+                blocks.setdefault(k, []).append(cid)
+        if progress:
+            progress(len(feats), total)
+    found = {}
+    for n, members in enumerate(blocks.values(), 1):
+        if len(members) > 1:
+            for a, b in _candidate_pairs(members, feats):
+                pair = (a, b) if a < b else (b, a)
+                if pair in found:
+                    continue
+                s = score(feats[a], feats[b])
+                if s >= min_score:
+                    found[pair] = s
+        if progress and n % 1000 == 0:
+            progress(len(feats), total)
+    return sorted(((s, a, b) for (a, b), s in found.items()), reverse=True)
+
+def clusters(pairs):
+    # [(id_a, id_b), ...] -> groups of ids connected by those pairs (union-find), each sorted
+    parent = {}
+    def root(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for a, b in pairs:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for x in parent:
+        groups.setdefault(root(x), []).append(x)
+    return [sorted(g) for g in groups.values()]
@@ -0,0 +1,108 @@
+# exporter.py — streaming export of contacts (or of recent changes) to CSV / gzip CSV / XLSX / Parquet
+import csv, gzip, importlib.util, io, tempfile
+
+from db import COLUMNS, iter_contacts, export_since
+
+KEYS = [k for k,_ in COLUMNS]
+HEADER = [lbl for _,lbl in COLUMNS]
+# export_changes(): DELTA_COLUMNS with labels
+DELTA_HEADER = ["Change #", "Change", "ID"] + HEADER + ["Created At", "Updated At"]
+
+# Exports larger than this move from memory to a temporary file on disk
+SPOOL_SIZE = 16 * 1024 * 1024
+
+# format -> (file extension, mime type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+# Optional packages (not in requirements.txt) the writer of a format needs
+REQUIRES = {"xlsx": "openpyxl", "parquet": "pyarrow"}
+
+def available_formats():
+    # FORMATS whose writer can run here, in FORMATS order (what the export UI offers)
+    return [f for f in FORMATS if f not in REQUIRES or importlib.util.find_spec(REQUIRES[f]) is not None]
+
+def _write_csv(out, batches, header=HEADER):
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(header)
+    for rows in batches:
+        w.writerows(rows)
+        out.write(buf.getvalue().encode("utf-8"))
+        buf.seek(0)
+        buf.truncate()
+    out.write(buf.getvalue().encode("utf-8"))
+
+def _write_csv_gz(out, batches, header=HEADER):
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        _write_csv(gz, batches, header)
+
+def _write_xlsx(out, batches, header=HEADER):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ImportError("XLSX export needs openpyxl (python -m pip install openpyxl)")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Contacts")
+    ws.append(header)
+    for rows in batches:
+        for r in rows:
+            ws.append(list(r))
+    wb.save(out)
+
+def _write_parquet(out, batches, header=HEADER):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (python -m pip install pyarrow)")
+    schema = pa.schema([(lbl, pa.string()) for lbl in header])
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in batches:
+            # str(): delta exports carry integer seq/id columns
+            cols = [[None if v is None else str(v) for v in c] for c in zip(*rows)]
+            writer.write_table(pa.Table.from_arrays([pa.array(c, pa.string()) for c in cols], schema=schema))
+
+WRITERS = {"csv": _write_csv, "csv.gz": _write_csv_gz, "xlsx": _write_xlsx, "parquet": _write_parquet}
+
+def _counted(batches, progress):
+    done = 0
+    for rows in batches:
+        yield rows
+        done += len(rows)
+        progress(done)
+
+def _export(fmt, batches, header, out, progress):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    own = out is None
+    if own:
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    if progress:
+        batches = _counted(batches, progress)
+    try:
+        WRITERS[fmt](out, batches, header)
+    except Exception:
+        if own:
+            out.close()
+        raise
+    if own:
+        out.seek(0)
+    return out
+
+def export_contacts(fmt="csv", filters=None, search_query="", out=None, progress=None):
+    # Streams matching contacts (same filters/search as db.list_contacts, e.g. a saved
+    # segment) into a file object positioned at 0. Rows are fetched in batches and the
+    # output spills to disk past SPOOL_SIZE, so memory stays bounded by the batch size.
+    # Pass out= to write into your own binary file instead (it is left open), and
+    # progress(rows_written) to be called after each batch.
+    return _export(fmt, iter_contacts(filters, search_query, columns=KEYS), HEADER, out, progress)
+
+def export_changes(since, upto=None, fmt="csv", out=None, progress=None):
+    # Like export_contacts, but only contacts changed after change #since (db.export_since):
+    # one row per contact with its latest values, deletions marked "D" in the Change column.
+    # Raises db.ChangeLogCompacted when the log no longer goes back that far.
+    return _export(fmt, export_since(since, upto), DELTA_HEADER, out, progress)
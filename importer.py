@@ -0,0 +1,87 @@
+# importer.py — streaming CSV/XLSX import
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+from db import COLUMNS, upsert_many, analyze, refresh_segments, parse_date_text
+
+KEYS = [k for k,_ in COLUMNS]
+KEY_BY_LABEL = {lbl: k for k,lbl in COLUMNS}
+# Same rule the import always used: fields whose label mentions "Date" are normalized to ISO
+DATE_KEYS = {k for k,lbl in COLUMNS if "Date" in lbl}
+
+BATCH_SIZE = 5000
+
+@lru_cache(maxsize=65536)
+def iso_date(val):
+    # Date text -> ISO "YYYY-MM-DD"; text that isn't a date is kept as written (db.normalize_date
+    # gives the YYYYMMDD day instead). Memoized: imports repeat the same few date strings thousands of times
+    if not val:
+        return ""
+    try:
+        return parse_date_text(val).isoformat()
+    except Exception:
+        return val.strip()
+
+def read_preview(upload, nrows=10):
+    # Header + first rows for the mapping UI; rewinds the upload afterwards
+    if upload.name.lower().endswith(".csv"):
+        df = pd.read_csv(upload, dtype=str, keep_default_na=False, nrows=nrows)
+    else:
+        df = pd.read_excel(upload, dtype=str, nrows=nrows)
+    upload.seek(0)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def iter_chunks(upload, chunksize=BATCH_SIZE):
+    # CSV is read incrementally; Excel can't be streamed by pandas, so it is sliced after loading
+    if upload.name.lower().endswith(".csv"):
+        reader = pd.read_csv(upload, dtype=str, keep_default_na=False, chunksize=chunksize)
+    else:
+        df = pd.read_excel(upload, dtype=str)
+        reader = (df.iloc[i:i+chunksize] for i in range(0, len(df), chunksize))
+    for chunk in reader:
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        yield chunk
+
+def map_chunk(chunk, mapping):
+    # mapping: {label: source header or ""} -> DataFrame with one column per COLUMNS key
+    out = pd.DataFrame("", index=chunk.index, columns=KEYS)
+    for lbl, src in mapping.items():
+        if not src or src not in chunk.columns:
+            continue
+        key = KEY_BY_LABEL[lbl]
+        col = chunk[src].fillna("").astype(str)
+        if key in DATE_KEYS:
+            uniq = col.unique()
+            col = col.map(dict(zip(uniq, map(iso_date, uniq))))
+        else:
+            col = col.str.strip()
+        out[key] = col
+    return out
+
+def import_stream(chunks, mapping, policy="overwrite", progress=None, totals=None):
+    # Each chunk is mapped and upserted (see db.upsert_many) as its own batch.
+    # progress(res, elapsed_seconds) is called after every commit with the running totals;
+    # totals seeds them when resuming a partly done import (see jobs.py).
+    # Returns {"rows", "inserted", "updated", "skipped", "seconds", "rows_per_sec"}.
+    t0 = time.perf_counter()
+    res = {"rows": 0, "inserted": 0, "updated": 0, "skipped": 0}
+    res.update({k: v for k, v in (totals or {}).items() if k in res})
+    start_rows = res["rows"]
+    for chunk in chunks:
+        mapped = map_chunk(chunk, mapping)
+        summary = upsert_many(list(mapped.itertuples(index=False, name=None)), policy=policy)
+        res["rows"] += len(mapped)
+        for k, v in summary.items():
+            res[k] += v
+        if progress:
+            progress(dict(res), time.perf_counter() - t0)
+    if res["inserted"] or res["updated"]:
+        analyze()
+        refresh_segments()
+    secs = time.perf_counter() - t0
+    res["seconds"] = secs
+    res["rows_per_sec"] = (res["rows"] - start_rows) / secs if secs else 0.0
+    return res
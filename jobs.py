@@ -0,0 +1,322 @@
+# jobs.py — background jobs for imports, bulk tag edits, exports and duplicate finding/merging
+#
+# A job is a row in db.JOBS_TABLE. submit_*() stores the job and hands it to a worker
+# thread, so the Streamlit script returns at once and the UI polls get_job()/list_jobs().
+# Handlers work in bounded chunks (one transaction each) and call job.progress() after
+# every chunk, which records progress + a checkpoint and raises JobCancelled once
+# cancel() was requested. resume() re-queues a cancelled/failed job from its checkpoint.
+# Several app instances may share one database: a running job records its owner (host:pid)
+# and the owner's heartbeat thread refreshes heartbeat_at every HEARTBEAT_EVERY seconds.
+# Only running jobs whose heartbeat went stale (their process died) are re-queued and
+# picked up again, on startup and by the heartbeat thread.
+import itertools, json, os, shutil, socket, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import db
+
+# Uploaded import files and finished exports
+JOBS_DIR = Path(__file__).with_name("jobs")
+
+# SQLite has a single writer, so jobs run one at a time (off the request path)
+JOB_WORKERS = 1
+TAG_CHUNK = 1000
+# Duplicate groups merged per transaction
+MERGE_CHUNK = 200
+# Progress without a checkpoint (exports) is written at most this often
+PROGRESS_EVERY = 0.5
+# Finished jobs (and their files) older than this are purged on startup
+KEEP_DAYS = 7
+# Seconds between heartbeats of running jobs; a running job whose heartbeat is older than
+# STALE_AFTER seconds belongs to a dead process and is re-queued
+HEARTBEAT_EVERY = 10
+STALE_AFTER = 60
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+ACTIVE_STATES = ("queued", "running")
+
+class JobCancelled(Exception):
+    pass
+
+class JobLost(JobCancelled):
+    # The job was re-queued for another process (this one missed its heartbeats)
+    pass
+
+class Job:
+    # What a handler sees: its params/checkpoint and a progress() hook
+    def __init__(self, row):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.params = json.loads(row["params"])
+        self.checkpoint = json.loads(row["checkpoint"]) if row["checkpoint"] else None
+        self._last = 0.0
+
+    def progress(self, done, total=None, checkpoint=None):
+        now = time.monotonic()
+        if checkpoint is None and now - self._last < PROGRESS_EVERY:
+            return
+        self._last = now
+        conn = db.get_conn()
+        with conn:
+            conn.execute(f"""
+                UPDATE {db.JOBS_TABLE} SET done = ?, total = coalesce(?, total),
+                  checkpoint = coalesce(?, checkpoint), updated_at = datetime('now'),
+                  heartbeat_at = datetime('now')
+                WHERE id = ? AND owner = ?
+            """, (done, total, None if checkpoint is None else json.dumps(checkpoint), self.id, OWNER))
+            cancel, owner = conn.execute(f"SELECT cancel_requested, owner FROM {db.JOBS_TABLE} WHERE id = ?",
+                                         (self.id,)).fetchone()
+        if owner != OWNER:
+            raise JobLost()
+        if cancel:
+            raise JobCancelled()
+
+# -------- Handlers: fn(job) -> result dict --------
+def _run_import(job):
+    from importer import iter_chunks, import_stream, BATCH_SIZE
+    p = job.params
+    cp = job.checkpoint or {}
+    path = Path(p["path"])
+    with open(path, "rb") as f:
+        # every chunk before the last one is exactly BATCH_SIZE rows
+        chunks = itertools.islice(iter_chunks(f), cp.get("rows", 0) // BATCH_SIZE, None)
+        res = import_stream(chunks, p["mapping"], policy=p["policy"], totals=cp,
+                            progress=lambda r, secs: job.progress(r["rows"], checkpoint=r))
+    path.unlink(missing_ok=True)
+    return res
+
+def _run_tags(job):
+    p = job.params
+    ids = p["ids"]
+    cp = job.checkpoint or {"offset": 0, "updated": 0}
+    for i in range(cp["offset"], len(ids), TAG_CHUNK):
+        n = db.update_tags(ids[i:i + TAG_CHUNK], add_tags=p["add"], remove_tags=p["remove"])
+        cp = {"offset": i + TAG_CHUNK, "updated": cp["updated"] + n}
+        job.progress(min(cp["offset"], len(ids)), checkpoint=cp)
+    return {"updated": cp["updated"]}
+
+def _run_export(job):
+    # Exports are read-only, so a resumed export simply starts over
+    from exporter import export_contacts, export_changes, FORMATS
+    p = job.params
+    path = JOBS_DIR / f"export-{job.id}{FORMATS[p['fmt']][0]}"
+    delta = p.get("since") is not None
+    total = None if delta else db.count_contacts(p["filters"], p["search_query"])
+    job.progress(0, total, checkpoint={})
+    # written under a name of this process and renamed when complete, so a process that
+    # lost the job (JobLost) can't clobber the file of the one that took it over
+    part = path.with_name(f"{path.name}.{os.getpid()}.part")
+    try:
+        with open(part, "wb") as f:
+            if delta:
+                export_changes(p["since"], p["upto"], p["fmt"], out=f, progress=job.progress)
+            else:
+                export_contacts(p["fmt"], p["filters"], p["search_query"], out=f, progress=job.progress)
+    except Exception:
+        part.unlink(missing_ok=True)
+        raise
+    part.replace(path)
+    res = {"path": str(path), "bytes": path.stat().st_size}
+    if delta:
+        res["upto"] = p["upto"]   # pass as since= next time
+    return res
+
+def _run_dedupe(job):
+    # Read-only until the end, so a resumed search starts over
+    import dedupe
+    pairs = dedupe.find_duplicates(job.params["min_score"], progress=job.progress)
+    db.save_duplicates(pairs)
+    return {"pairs": len(pairs)}
+
+def _run_merge(job):
+    # Groups are built from the saved pairs when the job starts and kept in the checkpoint,
+    # so a resumed merge continues with the same groups
+    cp = job.checkpoint
+    if cp is None:
+        import dedupe
+        groups = dedupe.clusters(db.duplicate_pairs(job.params["min_score"]))
+        cp = {"groups": groups, "offset": 0, "merged": 0, "removed": 0, "skipped": 0}
+        job.progress(0, total=len(groups), checkpoint=cp)
+    groups = cp["groups"]
+    for i in range(cp["offset"], len(groups), MERGE_CHUNK):
+        res = db.merge_contacts(groups[i:i + MERGE_CHUNK])
+        cp = {"groups": groups, "offset": i + MERGE_CHUNK,
+              **{k: cp[k] + res[k] for k in ("merged", "removed", "skipped")}}
+        job.progress(min(cp["offset"], len(groups)), checkpoint=cp)
+    return {k: cp[k] for k in ("merged", "removed", "skipped")}
+
+HANDLERS = {"import": _run_import, "tags": _run_tags, "export": _run_export,
+            "dedupe": _run_dedupe, "merge": _run_merge}
+
+# -------- Worker --------
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="vanto-job")
+            for job_id in _recover():
+                _pool.submit(_run, job_id)
+            threading.Thread(target=_heartbeat, args=(_pool,), name="vanto-job-heartbeat", daemon=True).start()
+        return _pool
+
+def _requeue_stale(conn):
+    # Running jobs whose owner stopped sending heartbeats (or that predate heartbeats)
+    return conn.execute(f"""
+        UPDATE {db.JOBS_TABLE} SET state = 'queued', owner = NULL
+        WHERE state = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < datetime('now', ?))
+    """, (f"-{STALE_AFTER} seconds",)).rowcount
+
+def _heartbeat(pool):
+    # Keeps this process's running jobs alive and picks up jobs of processes that died
+    conn = db.get_conn()
+    while True:
+        time.sleep(HEARTBEAT_EVERY)
+        try:
+            with conn:
+                conn.execute(f"""UPDATE {db.JOBS_TABLE} SET heartbeat_at = datetime('now')
+                                 WHERE state = 'running' AND owner = ?""", (OWNER,))
+                stale = _requeue_stale(conn)
+            if stale:
+                for (job_id,) in conn.execute(f"SELECT id FROM {db.JOBS_TABLE} WHERE state = 'queued' ORDER BY id"):
+                    pool.submit(_run, job_id)
+        except Exception:
+            pass        # database busy for longer than busy_timeout; try again next beat
+
+def _recover():
+    # Startup: re-queue jobs a dead process left running, purge old finished jobs.
+    # Jobs other live app instances are running keep their owner (see _heartbeat).
+    db.ensure_schema()
+    JOBS_DIR.mkdir(exist_ok=True)
+    conn = db.get_conn()
+    with conn:
+        _requeue_stale(conn)
+        old = conn.execute(f"""SELECT id, kind, params, result FROM {db.JOBS_TABLE}
+                               WHERE state NOT IN {ACTIVE_STATES}
+                                 AND finished_at < datetime('now', ?)""", (f"-{KEEP_DAYS} days",)).fetchall()
+        for r in old:
+            for d in (json.loads(r["params"]), json.loads(r["result"] or "{}")):
+                if d.get("path"):
+                    Path(d["path"]).unlink(missing_ok=True)
+        conn.executemany(f"DELETE FROM {db.JOBS_TABLE} WHERE id = ?", [(r["id"],) for r in old])
+    return [r[0] for r in conn.execute(f"SELECT id FROM {db.JOBS_TABLE} WHERE state = 'queued' ORDER BY id")]
+
+def _run(job_id):
+    conn = db.get_conn()
+    with conn:
+        # claim it; a job queued twice (submit + recovery) only runs once
+        claimed = conn.execute(f"""
+            UPDATE {db.JOBS_TABLE} SET state = 'running', updated_at = datetime('now'),
+              started_at = coalesce(started_at, datetime('now')),
+              owner = ?, heartbeat_at = datetime('now')
+            WHERE id = ? AND state = 'queued'
+        """, (OWNER, job_id)).rowcount
+    if not claimed:
+        return
+    job = Job(conn.execute(f"SELECT * FROM {db.JOBS_TABLE} WHERE id = ?", (job_id,)).fetchone())
+    state, result, error = "done", None, None
+    try:
+        result = HANDLERS[job.kind](job)
+    except JobLost:
+        return
+    except JobCancelled:
+        state = "cancelled"
+    except Exception as e:
+        state, error = "failed", f"{type(e).__name__}: {e}"
+    with conn:
+        conn.execute(f"""
+            UPDATE {db.JOBS_TABLE} SET state = ?, result = ?, error = ?, cancel_requested = 0,
+              done = CASE WHEN ? = 'done' THEN coalesce(total, done) ELSE done END,
+              finished_at = datetime('now'), updated_at = datetime('now')
+            WHERE id = ? AND owner = ?
+        """, (state, json.dumps(result) if result is not None else None, error, state, job_id, OWNER))
+
+def submit(kind, params, label="", total=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    db.ensure_schema()
+    conn = db.get_conn()
+    with conn:
+        job_id = conn.execute(f"INSERT INTO {db.JOBS_TABLE}(kind, label, params, total) VALUES (?, ?, ?, ?)",
+                              (kind, label, json.dumps(params), total)).lastrowid
+    _executor().submit(_run, job_id)
+    return job_id
+
+def submit_import(upload, mapping, policy="overwrite"):
+    # The upload is copied to JOBS_DIR first: the job outlives the browser session
+    JOBS_DIR.mkdir(exist_ok=True)
+    path = JOBS_DIR / f"import-{uuid.uuid4().hex}{Path(upload.name).suffix.lower()}"
+    upload.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload, f)
+    total = None
+    if path.suffix == ".csv":
+        with open(path, "rb") as f:
+            # data rows, give or take quoted line breaks
+            total = max(sum(b.count(b"\n") for b in iter(lambda: f.read(1 << 20), b"")) - 1, 0)
+    return submit("import", {"path": str(path), "mapping": mapping, "policy": policy},
+                  label=f"Import {upload.name}", total=total)
+
+def submit_tags(ids, add_tags=None, remove_tags=None):
+    ids = sorted({int(i) for i in ids})
+    return submit("tags", {"ids": ids, "add": add_tags or [], "remove": remove_tags or []},
+                  label=f"Tags on {len(ids)} contacts", total=len(ids))
+
+def submit_export(fmt, filters=None, search_query="", label=""):
+    return submit("export", {"fmt": fmt, "filters": filters, "search_query": search_query},
+                  label=label or f"Export {fmt}")
+
+def submit_changes_export(fmt, since, label=""):
+    # Delta export: contacts changed after change #since, up to the head at submit time
+    upto = db.change_head()
+    return submit("export", {"fmt": fmt, "since": int(since), "upto": upto},
+                  label=label or f"Changes #{since}–#{upto} ({fmt})")
+
+def submit_dedupe(min_score=None):
+    import dedupe
+    min_score = dedupe.MIN_SCORE if min_score is None else min_score
+    return submit("dedupe", {"min_score": min_score}, label="Find duplicates")
+
+def submit_merge(min_score):
+    # Merges the groups of Find duplicates' pairs scoring at least min_score
+    return submit("merge", {"min_score": min_score}, label=f"Merge duplicates (similarity {min_score:.2f}+)")
+
+def cancel(job_id):
+    # Queued jobs are cancelled at once; running ones stop after their current chunk
+    conn = db.get_conn()
+    with conn:
+        conn.execute(f"""UPDATE {db.JOBS_TABLE} SET state = 'cancelled', finished_at = datetime('now')
+                         WHERE id = ? AND state = 'queued'""", (job_id,))
+        conn.execute(f"UPDATE {db.JOBS_TABLE} SET cancel_requested = 1 WHERE id = ? AND state = 'running'", (job_id,))
+
+def resume(job_id):
+    conn = db.get_conn()
+    with conn:
+        ok = conn.execute(f"""UPDATE {db.JOBS_TABLE} SET state = 'queued', error = NULL, finished_at = NULL
+                              WHERE id = ? AND state IN ('cancelled', 'failed')""", (job_id,)).rowcount
+    if ok:
+        _executor().submit(_run, job_id)
+    return bool(ok)
+
+def _job_dict(r):
+    d = dict(r)
+    for k in ("params", "checkpoint", "result"):
+        d[k] = json.loads(d[k]) if d[k] else None
+    return d
+
+def get_job(job_id):
+    db.ensure_schema()
+    r = db.get_conn().execute(f"SELECT * FROM {db.JOBS_TABLE} WHERE id = ?", (job_id,)).fetchone()
+    return _job_dict(r) if r else None
+
+def list_jobs(kinds=None, limit=10):
+    # Newest first; also starts the worker, so jobs queued before a restart get run
+    _executor()
+    sql, params = f"SELECT * FROM {db.JOBS_TABLE}", []
+    if kinds:
+        sql += f" WHERE kind IN ({','.join('?' * len(kinds))})"
+        params = list(kinds)
+    return [_job_dict(r) for r in db.get_conn().execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])]
@@ -0,0 +1,107 @@
+# sync.py — keep a second SQLite file (a local stand-in for the reporting replica) in step
+# with the contacts table, using the change log (db.export_since)
+#
+#   python sync.py reporting.sqlite3 [--name reporting] [--every 60]
+#
+# The replica holds a plain copy of contacts (id + COLUMNS + created_at/updated_at) and a
+# sync_state row with the last change seq it applied. Each batch of deltas is applied in
+# one replica transaction together with that seq, so an interrupted sync resumes where it
+# stopped. The first sync, and any sync that fell behind the compacted log, copies
+# everything instead. The seq is also acknowledged to the CRM database (db.ack_changes),
+# so compaction keeps the log this replica still needs.
+import argparse, sqlite3, time
+from pathlib import Path
+
+import db
+
+STATE_TABLE = "sync_state"
+COPY_COLUMNS = ["id"] + [k for k,_ in db.COLUMNS] + ["created_at", "updated_at"]
+
+def open_replica(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    cols = ", ".join(f"{k} TEXT" for k in COPY_COLUMNS[1:])
+    with conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {db.TABLE} (id INTEGER PRIMARY KEY, {cols})")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+              source TEXT PRIMARY KEY,
+              seq INTEGER NOT NULL,
+              synced_at TEXT
+            )
+        """)
+    return conn
+
+def _set_seq(rconn, source, seq):
+    rconn.execute(f"""INSERT INTO {STATE_TABLE}(source, seq, synced_at) VALUES (?, ?, datetime('now'))
+                      ON CONFLICT(source) DO UPDATE SET seq = excluded.seq, synced_at = excluded.synced_at""",
+                  (source, seq))
+
+def _upsert_sql():
+    return f"INSERT OR REPLACE INTO {db.TABLE} ({', '.join(COPY_COLUMNS)}) VALUES ({', '.join('?' * len(COPY_COLUMNS))})"
+
+def full_copy(rconn, source, consumer):
+    # Registers the consumer at the current head first, so compaction can't drop the
+    # changes made while the copy runs; they are applied by the next delta pass.
+    head = db.change_head()
+    db.ack_changes(consumer, head)
+    sql = _upsert_sql()
+    n = 0
+    with rconn:
+        rconn.execute(f"DELETE FROM {db.TABLE}")
+        for rows in db.iter_contacts(columns=COPY_COLUMNS):
+            rconn.executemany(sql, rows)
+            n += len(rows)
+        _set_seq(rconn, source, head)
+    return head, n
+
+def sync(replica_path, consumer="replica"):
+    # One pass; returns {"seq", "copied", "upserted", "deleted"}
+    source = str(db.DB_PATH)
+    rconn = open_replica(replica_path)
+    try:
+        res = {"seq": None, "copied": 0, "upserted": 0, "deleted": 0}
+        row = rconn.execute(f"SELECT seq FROM {STATE_TABLE} WHERE source = ?", (source,)).fetchone()
+        seq = row[0] if row else None
+        try:
+            batches = db.export_since(seq) if seq is not None else None
+        except db.ChangeLogCompacted:
+            batches = None
+        if batches is None:
+            seq, res["copied"] = full_copy(rconn, source, consumer)
+            batches = db.export_since(seq)
+        sql = _upsert_sql()
+        for rows in batches:
+            ups = [r[2:] for r in rows if r[1] == "U"]
+            dels = [(r[2],) for r in rows if r[1] == "D"]
+            with rconn:
+                rconn.executemany(sql, ups)
+                rconn.executemany(f"DELETE FROM {db.TABLE} WHERE id = ?", dels)
+                seq = rows[-1][0]
+                _set_seq(rconn, source, seq)
+            res["upserted"] += len(ups)
+            res["deleted"] += len(dels)
+        db.ack_changes(consumer, seq)
+        res["seq"] = seq
+        return res
+    finally:
+        rconn.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Apply contact changes to a replica SQLite file")
+    ap.add_argument("replica")
+    ap.add_argument("--name", default="replica", help="consumer name the change log keeps entries for")
+    ap.add_argument("--db", help="CRM database (default: crm.sqlite3 next to db.py)")
+    ap.add_argument("--every", type=float, default=0, help="keep running, syncing every N seconds")
+    args = ap.parse_args()
+    if args.db:
+        db.DB_PATH = Path(args.db)
+    while True:
+        res = sync(args.replica, args.name)
+        print(f"#{res['seq']}: copied {res['copied']}, upserted {res['upserted']}, deleted {res['deleted']}", flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# tests/test_search.py — global search through the FTS5 trigram index must return the
+# same contacts as the original like_nocase() substring scan
+#
+#   python -m pytest -q
+import pytest
+
+import db
+
+CONTACTS = [
+    {"full_name": "José Mokoena", "phone_number": "082 555 1234", "email_address": "jose@example.com",
+     "city": "Durban"},
+    {"full_name": "JOSÉ NDLOVU", "phone_number": "0835550000", "tags": "vip, 100%"},
+    {"full_name": "Thabo O'Brien", "phone_number": "0720000001", "sponsor_name": 'Sipho "Big" Dlamini',
+     "email_address": "thabo_o@example.com"},
+    {"full_name": "Zoë Naidoo", "phone_number": "0610000002", "province": "KwaZulu-Natal",
+     "interest_level": "50% keen"},
+    {"full_name": "Naledi Ěx", "phone_number": "0610000003", "country": "South Africa", "apl_go_id": "APL_7"},
+    {"full_name": "Lerato Khumalo", "phone_number": "0740000004", "city": "Soweto", "tags": "follow-up"},
+]
+
+QUERIES = {
+    "3+ chars": ["mok", "MOKOENA", "soweto", "follow-up", "555 1234", "durban naidoo", "lerato soweto",
+                 "KwaZulu", "example.com"],
+    "1-2 chars": ["a", "zo", "ZO", "82", "th mok", "ex", "-"],
+    "non-ASCII": ["josé", "JOSÉ", "osé", "é", "É", "ë", "Ë", "zoë", "ZOË", "ěx", "Ěx", "ě"],
+    "% and _": ["%", "_", "0%", "% k", "100%", "o_", "_o@", "apl_7", "apl%"],
+    "quotes": ["'", "o'b", "O'BRIEN", '"', '"big"', 'big"', "'x"],
+}
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("search")
+    db.close_all()
+    db.DB_PATH, db.SEGMENTS_PATH = tmp / "search.sqlite3", tmp / "segments.json"
+    db.upsert_many(CONTACTS)
+    assert db.FTS_ENABLED, "SQLite without FTS5: nothing to compare"
+    yield db.get_conn()
+    db.close_all()
+
+def _ids(conn, query, fts):
+    enabled = db.FTS_ENABLED
+    db.FTS_ENABLED = fts
+    try:
+        sql, params = db.search_clause(query)
+    finally:
+        db.FTS_ENABLED = enabled
+    return sorted(r[0] for r in conn.execute(f"SELECT id FROM {db.TABLE} WHERE {sql}", params))
+
+@pytest.mark.parametrize("query", [q for qs in QUERIES.values() for q in qs])
+def test_fts_matches_substring_search(conn, query):
+    assert _ids(conn, query, fts=True) == _ids(conn, query, fts=False)
+
+def test_queries_find_something(conn):
+    # guards against both paths agreeing on "nothing" for every query of a kind
+    for kind, queries in QUERIES.items():
+        assert any(_ids(conn, q, fts=True) for q in queries), kind
+
+def test_short_non_ascii_token_folds_case(conn):
+    # LIKE only folds ASCII case; "é" must still find "JOSÉ"
+    assert _ids(conn, "é", fts=True) == _ids(conn, "É", fts=True) == [1, 2]
+
+def test_empty_query_matches_everything(conn):
+    assert db.search_clause("  ") == ("", [])
+    assert db.count_contacts(search_query="") == len(CONTACTS)
+
+def test_list_contacts_uses_search(conn):
+    rows = db.list_contacts(search_query="o'brien 072")
+    assert [r["full_name"] for r in rows] == ["Thabo O'Brien"]
+
+def test_first_search_in_a_new_process_uses_the_index(conn):
+    # a fresh process has not run ensure_schema() yet, so FTS_ENABLED is still False
+    db.close_all()
+    db.FTS_ENABLED = False
+    plan = "\n".join(db.explain(search_query="soweto"))
+    assert db.FTS_ENABLED and "contacts_fts" in plan, plan
@@ -0,0 +1,144 @@
+# tests/test_segments.py — saved segments' cached members must follow contact changes
+# (patched from the change log, rebuilt when the log no longer covers them) and the date
+# (follow-up segments), and compaction must keep what segments and sync consumers still need
+#
+#   python -m pytest -q
+from datetime import date, timedelta
+
+import pytest
+
+import db
+
+TODAY = date.today()
+
+CONTACTS = [
+    {"full_name": "Anna Dube", "phone_number": "0820000001", "city": "Durban", "tags": "vip"},
+    {"full_name": "Ben Zulu", "phone_number": "0820000002", "city": "Soweto", "tags": "vip, lead",
+     "next_action": TODAY.isoformat()},
+    {"full_name": "Cara Lee", "phone_number": "0820000003", "city": "Durban",
+     "next_action": (TODAY - timedelta(days=3)).isoformat()},
+    {"full_name": "Dan Mthembu", "phone_number": "0820000004", "city": "Cape Town", "tags": "lead"},
+]
+
+SEGMENTS = {
+    "durban": {"city": ["Durban"]},
+    "vip leads": {"tag_all": ["vip", "lead"]},
+    "due today": {"follow_up": "today"},
+    "overdue": {"follow_up": "overdue"},
+}
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    db.close_all()
+    db.DB_PATH, db.SEGMENTS_PATH = tmp_path / "segments.sqlite3", tmp_path / "segments.json"
+    for name in ("CHANGES_RETAIN", "CHANGES_MAX"):
+        monkeypatch.setattr(db, name, getattr(db, name))
+    db.upsert_many(CONTACTS)
+    for name, filters in SEGMENTS.items():
+        db.save_segment(name, filters)
+    yield db.get_conn()
+    db.close_all()
+
+def _ids(name):
+    return {r["id"] for r in db.list_contacts() if r["full_name"] == name}
+
+def _expected():
+    return {name: db.count_contacts(filters) for name, filters in db.load_segments().items()}
+
+def _plant(conn, segment, contact_id):
+    # a member the segment's filters don't match: only a full rebuild removes it
+    with conn:
+        conn.execute(f"""INSERT INTO {db.SEGMENT_MEMBERS_TABLE}(segment_id, contact_id)
+                         SELECT id, ? FROM {db.SEGMENTS_TABLE} WHERE name = ?""", (contact_id, segment))
+
+def _synced(conn):
+    return dict(conn.execute(f"SELECT name, synced_seq FROM {db.SEGMENTS_TABLE}").fetchall())
+
+def test_counts_follow_contact_changes(conn):
+    assert db.segment_counts() == _expected() == {"durban": 2, "vip leads": 1, "due today": 1, "overdue": 1}
+    [anna], [dan] = _ids("Anna Dube"), _ids("Dan Mthembu")
+    steps = [
+        lambda: db.update_rows([{"id": anna, "city": "Soweto"}]),                      # out of durban
+        lambda: db.update_rows([{"id": dan, "city": "Durban"}]),                       # into durban
+        lambda: db.update_tags([anna, dan], add_tags=["vip", "lead"]),                 # into vip leads
+        lambda: db.update_tags([dan], remove_tags=["vip"]),                            # out again
+        lambda: db.upsert_many([{"full_name": "Eve Nkosi", "phone_number": "0820000005", "city": "Durban",
+                                 "next_action": TODAY.isoformat()}]),                  # new contact
+        lambda: db.update_rows([{"id": anna, "next_action": TODAY.isoformat()}]),      # due today
+        lambda: db.merge_contacts([sorted(_ids("Dan Mthembu") | _ids("Eve Nkosi"))]),  # one deleted
+    ]
+    for step in steps:
+        step()
+        assert db.segment_counts() == _expected()
+    for name, filters in db.load_segments().items():
+        assert db.segment_member_ids(name) == [r["id"] for r in db.list_contacts(filters)]
+
+def test_recent_changes_are_patched(conn):
+    db.segment_counts()
+    [ben] = _ids("Ben Zulu")
+    _plant(conn, "durban", ben)
+    db.update_rows([{"id": _ids("Dan Mthembu").pop(), "city": "Durban"}])
+    assert db.segment_counts()["durban"] == 4    # 3 real members + the planted one
+    assert ben in db.segment_member_ids("durban")
+
+def test_behind_the_compacted_log_is_rebuilt(conn):
+    db.segment_counts()
+    [ben] = _ids("Ben Zulu")
+    _plant(conn, "durban", ben)
+    db.update_rows([{"id": _ids("Dan Mthembu").pop(), "city": "Durban"}])
+    # the log is compacted past the segments' synced_seq (CHANGES_MAX: no segment is kept)
+    db.CHANGES_RETAIN = db.CHANGES_MAX = 0
+    db.compact_changes()
+    assert db._changes_floor(conn) > max(_synced(conn).values())
+    assert db.segment_counts() == _expected()
+    assert ben not in db.segment_member_ids("durban")
+
+def test_edited_segment_is_rebuilt(conn):
+    db.segment_counts()
+    db.save_segment("durban", {"city": ["Durban", "Cape Town"]})
+    assert db.segment_counts()["durban"] == 3 == db.count_contacts({"city": ["Durban", "Cape Town"]})
+
+def test_follow_up_segments_move_with_the_date(conn, monkeypatch):
+    assert db.segment_counts() == _expected()
+    synced = _synced(conn)
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return TODAY + timedelta(days=1)
+    monkeypatch.setattr(db, "date", Tomorrow)
+    # no contact changed, but Ben's follow-up is now overdue
+    assert db.segment_counts() == _expected() == {"durban": 2, "vip leads": 1, "due today": 0, "overdue": 2}
+    assert db.segment_member_ids("overdue") == sorted(_ids("Ben Zulu") | _ids("Cara Lee"), reverse=True)
+    assert _synced(conn)["durban"] == synced["durban"]    # other segments are left alone
+
+def test_compaction_keeps_what_segments_need(conn):
+    db.CHANGES_RETAIN = 0
+    db.segment_counts()
+    synced = min(_synced(conn).values())
+    assert db._changes_floor(conn) == synced == db.change_head()
+    db.update_rows([{"id": _ids("Anna Dube").pop(), "city": "Soweto"}])
+    db.compact_changes()
+    assert db._changes_floor(conn) == synced    # the segments haven't seen the change yet
+    assert db.segment_counts() == _expected()
+    assert db._changes_floor(conn) == db.change_head()
+
+def test_compaction_keeps_what_consumers_need(conn):
+    db.CHANGES_RETAIN = 0
+    db.segment_counts()
+    head = db.change_head()
+    db.ack_changes("reporting", head)
+    db.update_rows([{"id": _ids("Anna Dube").pop(), "city": "Soweto"}])
+    db.update_rows([{"id": _ids("Dan Mthembu").pop(), "city": "Soweto"}])
+    db.segment_counts()
+    assert db._changes_floor(conn) == head
+    assert [r[2] for batch in db.export_since(head) for r in batch] == \
+        sorted(_ids("Anna Dube") | _ids("Dan Mthembu"))
+    # a consumer further behind than CHANGES_MAX has to start over
+    db.CHANGES_MAX = 1
+    db.compact_changes()
+    assert db._changes_floor(conn) == db.change_head() - 1
+    with pytest.raises(db.ChangeLogCompacted):
+        list(db.export_since(head))
+    db.drop_consumer("reporting")
+    db.compact_changes()
+    assert db._changes_floor(conn) == db.change_head()
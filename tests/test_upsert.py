@@ -0,0 +1,78 @@
+# tests/test_upsert.py — imports merge into existing contacts by APL Go ID / phone according
+# to the upsert policy, and report what they inserted, updated and skipped
+#
+#   python -m pytest -q
+import pytest
+
+import db
+
+ANNA = {"full_name": "Anna Dube", "phone_number": "082 555 1234", "city": "Durban", "email_address": ""}
+BEN = {"full_name": "Ben Zulu", "phone_number": "0831110000", "apl_go_id": "APL1"}
+
+@pytest.fixture
+def conn(tmp_path):
+    db.close_all()
+    db.DB_PATH, db.SEGMENTS_PATH = tmp_path / "upsert.sqlite3", tmp_path / "segments.json"
+    db.upsert_many([ANNA, BEN])
+    yield db.get_conn()
+    db.close_all()
+
+def _contacts():
+    return {r["full_name"]: r for r in db.list_contacts()}
+
+@pytest.mark.parametrize("policy, city, email", [
+    ("overwrite", "Soweto", "anna@example.com"),    # non-blank incoming values win
+    ("fill_blanks", "Durban", "anna@example.com"),  # only empty fields are filled
+    ("skip", "Durban", ""),                         # existing contacts are left alone
+])
+def test_policies(conn, policy, city, email):
+    # same phone written differently: +27 form of ANNA's 082 number
+    row = {"full_name": "Anna Dube", "phone_number": "+27 82 555 1234", "city": "Soweto",
+           "email_address": "anna@example.com", "country": ""}
+    res = db.upsert_many([row], policy=policy)
+    updated = policy != "skip"
+    assert res == {"inserted": 0, "updated": int(updated), "skipped": int(not updated)}
+    anna = _contacts()["Anna Dube"]
+    assert (anna["city"], anna["email_address"]) == (city, email)
+    assert anna["phone_number"] == (row if policy == "overwrite" else ANNA)["phone_number"]
+    assert db.count_contacts() == 2
+
+def test_apl_go_id_matches_before_phone(conn):
+    res = db.upsert_many([{"full_name": "Ben Zulu", "phone_number": "0849990000", "apl_go_id": "APL1"}])
+    assert res == {"inserted": 0, "updated": 1, "skipped": 0}
+    assert _contacts()["Ben Zulu"]["phone_number"] == "0849990000"
+
+def test_summary(conn):
+    rows = [
+        {"full_name": "Cara Lee", "phone_number": "0840000001"},   # new
+        {**BEN, "city": "Pretoria"},                                # changed
+        dict(ANNA),                                                 # unchanged
+        {"full_name": "Cara Lee", "phone_number": "084 000 0001", "city": "Cape Town"},  # same batch, merged
+    ]
+    assert db.upsert_many(rows) == {"inserted": 1, "updated": 2, "skipped": 1}
+    assert _contacts()["Cara Lee"]["city"] == "Cape Town"
+    assert db.upsert_many([]) == {"inserted": 0, "updated": 0, "skipped": 0}
+    with pytest.raises(ValueError):
+        db.upsert_many(rows, policy="replace")
+
+def test_apl_and_phone_conflict_falls_back_to_row_by_row(conn):
+    # APL1 is Ben but the phone is Anna's: the row can't be merged into either, and is skipped
+    # while the rest of the batch still goes in
+    rows = [{"full_name": "Dan Mthembu", "phone_number": "0850000002"},
+            {"full_name": "Ben or Anna", "phone_number": "0825551234", "apl_go_id": "APL1"},
+            {**BEN, "city": "Pretoria"}]
+    assert db.upsert_many(rows) == {"inserted": 1, "updated": 1, "skipped": 1}
+    contacts = _contacts()
+    assert set(contacts) == {"Anna Dube", "Ben Zulu", "Dan Mthembu"}
+    assert contacts["Ben Zulu"]["city"] == "Pretoria"
+    assert contacts["Anna Dube"]["phone_number"] == ANNA["phone_number"]
+
+def test_reimport_is_a_no_op(conn):
+    rows = [{"full_name": f"Contact {i}", "phone_number": f"07{i:08d}", "tags": "b, a"} for i in range(50)]
+    assert db.upsert_many(rows)["inserted"] == 50
+    before = conn.execute(f"SELECT id, updated_at, tags FROM {db.TABLE} ORDER BY id").fetchall()
+    head = db.change_head()
+    for policy in db.UPSERT_POLICIES:
+        assert db.upsert_many(rows, policy=policy) == {"inserted": 0, "updated": 0, "skipped": 50}
+    assert conn.execute(f"SELECT id, updated_at, tags FROM {db.TABLE} ORDER BY id").fetchall() == before
+    assert db.change_head() == head
@@ -0,0 +1,144 @@
+# tests/test_writes.py — the write path: ops grouped into one transaction, a failing op
+# rolled back and re-run on its own, _Rerun, backoff on busy errors, and the writer queue
+#
+#   python -m pytest -q
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    db.close_all()
+    db.DB_PATH, db.SEGMENTS_PATH = tmp_path / "writes.sqlite3", tmp_path / "segments.json"
+    monkeypatch.setattr(db, "WRITE_QUEUE", db.WRITE_QUEUE)
+    conn = db._connect(str(db.DB_PATH))
+    conn.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    yield conn
+    conn.close()
+    db.close_all()
+
+@pytest.fixture
+def groups(monkeypatch):
+    # sizes of the transactions _run_ops runs, in order
+    sizes = []
+    run_group = db._run_group
+    def spy(conn, ops):
+        sizes.append(len(ops))
+        return run_group(conn, ops)
+    monkeypatch.setattr(db, "_run_group", spy)
+    return sizes
+
+def ins(x):
+    return lambda conn: conn.execute("INSERT INTO t VALUES (?)", (x,)).rowcount
+
+def _rows(conn):
+    return [r[0] for r in conn.execute("SELECT x FROM t ORDER BY x")]
+
+def test_group_commits_once(conn, groups):
+    assert db._run_ops(conn, [ins(1), ins(2), ins(3)]) == [(True, 1)] * 3
+    assert groups == [3]
+    assert not conn.in_transaction
+    assert _rows(conn) == [1, 2, 3]
+
+def test_failing_op_reruns_the_others_alone(conn, groups):
+    res = db._run_ops(conn, [ins(1), ins(1), ins(2)])
+    assert [ok for ok, _ in res] == [True, False, True]
+    assert isinstance(res[1][1], sqlite3.IntegrityError)
+    assert groups == [3, 1, 1, 1]
+    assert _rows(conn) == [1, 2]
+
+def test_single_failing_op_is_not_rerun(conn, groups):
+    def op(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        return 1 / 0
+    [(ok, e)] = db._run_ops(conn, [op])
+    assert not ok and isinstance(e, ZeroDivisionError)
+    assert groups == [1]
+    assert _rows(conn) == []
+
+def test_rerun(conn, groups):
+    runs = []
+    def op(conn):
+        # writes, then asks for a rerun the first time: the first write must be rolled back
+        runs.append(conn.execute("INSERT INTO t VALUES (?)", (10 + len(runs),)).rowcount)
+        if len(runs) == 1:
+            raise db._Rerun()
+        return len(runs)
+    assert db._run_ops(conn, [ins(1), op]) == [(True, 1), (True, 2)]
+    assert groups == [2, 1, 1]
+    assert _rows(conn) == [1, 11]
+    with conn:
+        conn.execute("DELETE FROM t")
+    runs.clear(), groups.clear()
+    assert db._run_ops(conn, [op]) == [(True, 2)]
+    assert groups == [1, 1]
+    assert _rows(conn) == [11]
+
+def test_busy_errors_back_off(conn, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(db.time, "sleep", sleeps.append)
+    busy = 3
+    def op(conn):
+        nonlocal busy
+        if busy:
+            busy -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return conn.execute("INSERT INTO t VALUES (1)").rowcount
+    assert db._run_with_retry(conn, [ins(2), op]) == [(True, 1), (True, 1)]
+    assert len(sleeps) == 3
+    for i, s in enumerate(sleeps):
+        assert 0.5 * db.WRITE_BACKOFF * 2 ** i <= s < 1.5 * db.WRITE_BACKOFF * 2 ** i
+    assert _rows(conn) == [1, 2]
+
+def test_busy_errors_give_up(conn, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(db.time, "sleep", sleeps.append)
+    monkeypatch.setattr(db, "WRITE_RETRIES", 2)
+    def op(conn):
+        raise sqlite3.OperationalError("database is locked")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        db._run_with_retry(conn, [ins(1), op])
+    assert len(sleeps) == 2
+    assert _rows(conn) == []
+
+def test_queue_isolates_a_failing_op(conn, groups):
+    db.configure_writes(queue=True)
+    writer = db._writer()
+    release = threading.Event()
+    blocker = writer.submit(lambda c: release.wait(5))
+    results = {}
+    def call(name, op):
+        try:
+            results[name] = ("ok", db._write(op))
+        except Exception as e:
+            results[name] = ("raised", e)
+    threads = [threading.Thread(target=call, args=args)
+               for args in [("a", ins(1)), ("bad", lambda c: 1 / 0), ("b", ins(2))]]
+    for t in threads:
+        t.start()
+    # all three wait behind the blocker, so the writer takes them as one group
+    deadline = time.monotonic() + 5
+    while writer.queue.qsize() < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert blocker.result(5)
+    assert results["a"] == results["b"] == ("ok", 1)
+    assert results["bad"][0] == "raised" and isinstance(results["bad"][1], ZeroDivisionError)
+    assert groups == [1, 3, 1, 1, 1]
+    assert _rows(conn) == [1, 2]
+
+def test_queued_upsert_falls_back_to_row_by_row(conn):
+    db.configure_writes(queue=True)
+    db.upsert_many([{"full_name": "Ben", "phone_number": "0831110000", "apl_go_id": "APL1"},
+                    {"full_name": "Anna", "phone_number": "0825551234"}])
+    # APL1 is Ben, the phone is Anna's: skipped, the other row still goes in
+    res = db.upsert_many([{"full_name": "Ben or Anna", "phone_number": "0825551234", "apl_go_id": "APL1"},
+                          {"full_name": "Cara", "phone_number": "0840000001"}])
+    assert res == {"inserted": 1, "updated": 0, "skipped": 1}
+    assert db.count_contacts() == 3
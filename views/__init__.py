@@ -0,0 +1,18 @@
+# views — one module per sidebar page, each with a render() function.
+# A page's module (and whatever it imports, e.g. pandas) is only loaded the first time
+# that page is shown, so light pages like Help don't pay for the heavy ones.
+import importlib
+
+PAGES = {
+    "Dashboard": "dashboard",
+    "Contacts": "contacts",
+    "Orders": "orders",
+    "Campaigns": "campaigns",
+    "WhatsApp Tools": "whatsapp",
+    "Import / Export": "import_export",
+    "Settings": "settings",
+    "Help": "help",
+}
+
+def render(page):
+    importlib.import_module(f"{__name__}.{PAGES[page]}").render()
@@ -0,0 +1,6 @@
+# views/campaigns.py
+import streamlit as st
+
+def render():
+    st.title("Campaigns")
+    st.info("Campaigns module placeholder.")
@@ -0,0 +1,103 @@
+# views/common.py — helpers shared by the page modules
+import time
+from pathlib import Path
+
+import streamlit as st
+
+import jobs
+from db import COLUMNS, to_frame, parse_date_text
+from exporter import FORMATS as EXPORT_FORMATS
+
+KEYS = [k for k,_ in COLUMNS]
+LABELS = {k: lbl for k,lbl in COLUMNS}
+
+STATUS_OPTIONS = {
+    "lead_temperature": ["Hot","Warm","Cold"],
+    "communication_status": ["New","In Progress","Pending","Completed"],
+    "registration_status": ["Activated","Registered","Not Registered"],
+}
+
+def df_from_columns(data, categorical=True):
+    # db.fetch_columns() -> DataFrame (see db.to_frame); deferred pandas import, so only
+    # pages that show tables pay for it. An empty result gives one blank row.
+    t = time.perf_counter()
+    try:
+        if not any(data.values()):
+            data = {k: ("",) for k in data}
+            categorical = False
+        return to_frame(data, categorical)
+    finally:
+        phase_times = st.session_state.setdefault("phase_times", {"materialize": 0.0})
+        phase_times["materialize"] += time.perf_counter() - t
+
+def to_human(df):
+    return df.rename(columns=LABELS)
+
+def parse_date(val):
+    import pandas as pd
+    if not val or str(val).strip()=="" or pd.isna(val):
+        return ""
+    try:
+        return parse_date_text(str(val)).isoformat()
+    except Exception:
+        return str(val).strip()
+
+JOB_STATE_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌", "cancelled": "⏹️"}
+
+def _jobs_table(kinds, live):
+    for j in jobs.list_jobs(kinds, limit=5):
+        c1,c2 = st.columns([4,1])
+        done, total = j["done"], j["total"]
+        text = f"{JOB_STATE_ICONS[j['state']]} #{j['id']} {j['label']} — {j['state']}, {done:,}" + (f" / {total:,}" if total else "")
+        if j["state"] in jobs.ACTIVE_STATES:
+            c1.progress(min(done / total, 1.0) if total else 0.0, text=text)
+            if c2.button("Cancel", key=f"job_cancel_{j['id']}"):
+                jobs.cancel(j["id"])
+        else:
+            c1.write(text)
+            if j["error"]:
+                c1.caption(j["error"])
+            res = j["result"] or {}
+            if j["kind"] == "import" and res:
+                c1.caption(f"{res['rows']} rows in {res['seconds']:.1f}s: {res['inserted']} new, "
+                           f"{res['updated']} updated, {res['skipped']} unchanged/skipped.")
+            if j["kind"] == "export" and "upto" in res:
+                c1.caption(f"Changes up to #{res['upto']:,}.")
+            if j["kind"] == "dedupe" and res:
+                c1.caption(f"{res['pairs']:,} likely duplicate pairs found.")
+            if j["kind"] == "merge" and res:
+                c1.caption(f"{res['merged']} groups merged, {res['removed']} contacts removed"
+                           + (f", {res['skipped']} skipped (APL Go ID / phone used elsewhere)." if res["skipped"] else "."))
+            if j["kind"] == "tags" and res:
+                c1.caption(f"Tags updated on {res['updated']} contacts.")
+            if j["state"] in ("cancelled", "failed") and c2.button("Resume", key=f"job_resume_{j['id']}"):
+                jobs.resume(j["id"])
+                st.rerun()
+            if j["kind"] == "export" and res.get("path") and not live:
+                path = Path(res["path"])
+                ext, mime = EXPORT_FORMATS[j["params"]["fmt"]]
+                # the download button holds the whole file in memory, so only the export
+                # picked with "Prepare download" gets one
+                if path.exists() and st.session_state.get("job_download") == j["id"]:
+                    if c2.download_button("Download", data=path.read_bytes(), file_name=f"v3_export{ext}",
+                                          mime=mime, key=f"job_dl_{j['id']}"):
+                        st.session_state.pop("job_download", None)
+                elif path.exists() and c2.button("Prepare download", key=f"job_prep_{j['id']}"):
+                    st.session_state["job_download"] = j["id"]
+                    st.rerun()
+    if live and not any(j["state"] in jobs.ACTIVE_STATES for j in jobs.list_jobs(kinds, limit=5)):
+        st.rerun()      # full rerun: static view with download buttons
+
+def jobs_panel(kinds):
+    # Polls every 2s while a job is queued/running (a fragment, so only this part reruns)
+    if any(j["state"] in jobs.ACTIVE_STATES for j in jobs.list_jobs(kinds, limit=5)):
+        st.fragment(run_every=2)(_jobs_table)(kinds, live=True)
+    else:
+        _jobs_table(kinds, live=False)
+
+def kpi_link(label, value, set_filters):
+    c = st.container()
+    if c.button(f"{label}\n**{value}**"):
+        st.session_state["contacts_filters"] = set_filters
+        st.session_state["page"] = "Contacts"
+        st.rerun()
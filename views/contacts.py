@@ -0,0 +1,254 @@
+# views/contacts.py
+import sqlite3
+from datetime import date
+import pandas as pd
+import streamlit as st
+
+import dedupe
+import jobs
+from db import (
+    fetch_columns, count_contacts, next_cursor, insert_one, update_rows, facets,
+    load_segments, save_segment, segment_counts, list_duplicates, count_duplicates, FOLLOW_UP_FILTER
+)
+from views.common import KEYS, LABELS, STATUS_OPTIONS, df_from_columns, parse_date, jobs_panel
+
+def render():
+    st.title("Contacts")
+
+    # Quick Add
+    with st.expander("➕ Add New Contact", expanded=True):
+        # outcome of the last save, kept across the rerun that follows it
+        saved = st.session_state.pop("quick_add_saved", None)
+        if saved == "inserted":
+            st.success("Contact added ✅")
+        elif saved == "merged":
+            st.info("A contact with this APL Go ID / phone already exists — filled in its blank fields.")
+        c1,c2,c3,c4 = st.columns(4)
+        full_name = c1.text_input("Full Name *")
+        phone = c2.text_input("Phone Number *")
+        email = c3.text_input("Email Address")
+        date_captured = c4.text_input("Date Captured (YYYY-MM-DD)", value=date.today().isoformat())
+
+        c5,c6,c7,c8 = st.columns(4)
+        country = c5.text_input("Country", value="South Africa")
+        province = c6.text_input("Province")
+        city = c7.text_input("City")
+        state = c8.text_input("State")
+
+        c9,c10,c11 = st.columns(3)
+        lt = c9.selectbox("Lead Temperature", STATUS_OPTIONS["lead_temperature"], index=1)
+        cs = c10.selectbox("Communication Status", STATUS_OPTIONS["communication_status"], index=0)
+        rs = c11.selectbox("Registration Status", STATUS_OPTIONS["registration_status"], index=2)
+
+        c12,c13,c14 = st.columns(3)
+        source = c12.text_input("Source")
+        interest = c13.text_input("Interest Level")
+        assigned = c14.text_input("Assigned To")
+
+        tags = st.text_input("Tags (comma separated)")
+        c15,c16,c17,c18 = st.columns(4)
+        next_action = c15.text_input("Next Action (YYYY-MM-DD)")
+        action_taken = c16.text_input("Action Taken")
+        username = c17.text_input("APL Go ID")
+        password = c18.text_input("Account Password")
+        sponsor = st.text_input("Sponsor Name")
+        lead_type = st.text_input("Lead Type")
+        associate_status = st.text_input("Associate Status")
+
+        if st.button("Save Contact", type="primary"):
+            if not full_name.strip() or not phone.strip():
+                st.error("Full Name and Phone Number are required.")
+            else:
+                rec = {
+                    "full_name": full_name.strip(),
+                    "phone_number": phone.strip(),
+                    "email_address": email.strip(),
+                    "date_captured": parse_date(date_captured),
+                    "country": country.strip(),
+                    "province": province.strip(),
+                    "city": city.strip(),
+                    "state": state.strip(),
+                    "lead_temperature": lt,
+                    "communication_status": cs,
+                    "registration_status": rs,
+                    "source": source.strip(),
+                    "interest_level": interest.strip(),
+                    "assigned_to": assigned.strip(),
+                    "tags": tags.strip(),
+                    "next_action": parse_date(next_action),
+                    "action_taken": action_taken.strip(),
+                    "username": username.strip(),
+                    "account_password": password.strip(),
+                    "sponsor_name": sponsor.strip(),
+                    "lead_type": lead_type.strip(),
+                    "associate_status": associate_status.strip(),
+                    "apl_go_id": username.strip() if username else "",
+                }
+                # an existing contact with the same APL Go ID / phone only gets its blank fields filled
+                res = insert_one(rec, policy="fill_blanks")
+                st.session_state["quick_add_saved"] = "inserted" if res["inserted"] else "merged"
+                st.rerun()
+
+    # Search + Filters
+    search = st.text_input("Global search (name / phone / email / sponsor / APL Go ID / city / province / country / interest / tags)", value="")
+
+    # Load saved segments
+    with st.expander("Saved segments"):
+        segs = load_segments()
+        seg_counts = segment_counts()
+        col_s1, col_s2 = st.columns([2,1])
+        with col_s1:
+            if segs:
+                chosen = st.selectbox("Apply segment", [""] + list(segs.keys()),
+                                      format_func=lambda n: f"{n} ({seg_counts.get(n, 0):,})" if n else "")
+                if chosen:
+                    st.session_state["contacts_filters"] = segs[chosen]
+                    st.success(f"Segment '{chosen}' applied. Scroll down to see results.")
+            else:
+                st.caption("No segments saved yet.")
+        with col_s2:
+            seg_name = st.text_input("New segment name")
+            if st.button("Save current filters as segment", disabled=not seg_name.strip()):
+                # we'll store current filters after they are built below
+                st.session_state["save_segment_name"] = seg_name.strip()
+
+    # Build filters UI
+    fc = facets(["country","province","city","assigned_to","sponsor_name","tags"])
+    def facet_select(col, label, column):
+        n = dict(fc[column])
+        return col.multiselect(label, list(n), format_func=lambda v: f"{v} ({n[v]})")
+
+    c1,c2,c3,c4 = st.columns(4)
+    f_lt = c1.multiselect("Lead Temperature", STATUS_OPTIONS["lead_temperature"])
+    f_cs = c2.multiselect("Communication Status", STATUS_OPTIONS["communication_status"])
+    f_rs = c3.multiselect("Registration Status", STATUS_OPTIONS["registration_status"])
+    f_country = facet_select(c4, "Country", "country")
+
+    c5,c6,c7,c8 = st.columns(4)
+    f_prov = facet_select(c5, "Province", "province")
+    f_city = facet_select(c6, "City", "city")
+    f_assigned = facet_select(c7, "Assigned To", "assigned_to")
+    f_sponsor = facet_select(c8, "Sponsor Name", "sponsor_name")
+
+    t1,t2,t3 = st.columns([3,1,1])
+    f_tags = facet_select(t1, "Tags", "tags")
+    tag_mode = t2.radio("Match tags", ["any","all"], horizontal=True)
+    f_follow = t3.selectbox("Next Action", ["", "due", "overdue", "today", "upcoming"],
+                            format_func={"": "Any", "due": "Due (incl. overdue)", "overdue": "Overdue",
+                                         "today": "Due today", "upcoming": "Next 7 days"}.get)
+
+    # Use session_state preset filters (from KPIs or segments)
+    preset = st.session_state.get("contacts_filters", {})
+    filters = {}
+    if f_lt: filters["lead_temperature"] = f_lt
+    if f_cs: filters["communication_status"] = f_cs
+    if f_rs: filters["registration_status"] = f_rs
+    if f_country: filters["country"] = f_country
+    if f_prov: filters["province"] = f_prov
+    if f_city: filters["city"] = f_city
+    if f_assigned: filters["assigned_to"] = f_assigned
+    if f_sponsor: filters["sponsor_name"] = f_sponsor
+    if f_tags: filters[f"tag_{tag_mode}"] = f_tags
+    if f_follow: filters[FOLLOW_UP_FILTER] = f_follow
+    if preset:
+        # merge preset (do not overwrite explicit UI choices)
+        for k,v in preset.items():
+            filters.setdefault(k, v)
+
+    # Save segment now if requested
+    if "save_segment_name" in st.session_state:
+        try:
+            save_segment(st.session_state.pop("save_segment_name"), filters)
+            st.success("Segment saved.")
+        except ValueError as e:
+            st.error(str(e))
+
+    # Paging (keyset): cursors[i] is the cursor that loads page i
+    p1,p2,p3,p4,p5 = st.columns([2,2,1,1,2])
+    sort_by = p1.selectbox("Sort by", ["id"]+KEYS, format_func=lambda k: "Newest" if k=="id" else LABELS[k])
+    page_size = p2.selectbox("Rows per page", [25,50,100,250], index=1)
+    descending = sort_by == "id"
+    page_key = repr((sorted(filters.items()), search, sort_by, page_size))
+    if st.session_state.get("contacts_page_key") != page_key:
+        st.session_state["contacts_page_key"] = page_key
+        st.session_state["contacts_cursors"] = [None]
+    cursors = st.session_state["contacts_cursors"]
+
+    total = count_contacts(filters=filters, search_query=search)
+    page = fetch_columns(filters=filters, search_query=search, limit=page_size, cursor=cursors[-1],
+                         sort_by=sort_by, descending=descending)
+    page_no = len(cursors)
+    has_next = page_no * page_size < total
+    if p3.button("◀ Prev", disabled=page_no == 1):
+        cursors.pop()
+        st.rerun()
+    if p4.button("Next ▶", disabled=not has_next):
+        cursors.append(next_cursor(page, sort_by))
+        st.rerun()
+    n_pages = max(1, -(-total // page_size))
+    p5.caption(f"Page {page_no} of {n_pages} · {total} contacts")
+    # plain object columns: categoricals would turn the editor cells into fixed dropdowns
+    df = df_from_columns(page, categorical=False)
+
+    # Inline editor
+    show_cols = ["full_name","phone_number","email_address","lead_temperature","communication_status","registration_status",
+                 "assigned_to","sponsor_name","lead_type","associate_status","date_captured","country","province","city","state",
+                 "tags","next_action","action_taken","apl_go_id","account_password","source","interest_level"]
+    for c in show_cols:
+        if c not in df.columns: df[c] = ""
+    st.caption("Tip: Edit cells below, then click **Save table changes**.")
+    edited = st.data_editor(df[["id"]+show_cols], use_container_width=True, num_rows="fixed", disabled={"id": True}, key="contacts_editor")
+
+    if st.button("Save table changes", type="primary"):
+        # write only the cells touched in the editor (its edit delta), keyed back to contact ids
+        changes = []
+        for pos, cells in st.session_state["contacts_editor"].get("edited_rows", {}).items():
+            rid = df.iloc[int(pos)]["id"]
+            if rid == "" or pd.isna(rid):
+                continue
+            rec = {k: ("" if v is None else v) for k, v in cells.items()}
+            rec["id"] = int(rid)
+            changes.append(rec)
+        try:
+            n = update_rows(changes)
+        except sqlite3.IntegrityError:
+            st.error("Another contact already has that APL Go ID / phone number — nothing was saved.")
+        else:
+            st.success(f"Saved {n} updates.")
+            st.rerun()
+
+    # Bulk tags
+    with st.expander("Bulk: Tags"):
+        id_str = st.text_input("IDs to update (comma-separated)", "")
+        ids = []
+        if id_str.strip():
+            ids = [int(x.strip()) for x in id_str.split(",") if x.strip().isdigit()]
+        add_t = st.text_input("Add tags (comma-separated)")
+        rem_t = st.text_input("Remove tags (comma-separated)")
+        if st.button("Apply tag changes", disabled=not ids):
+            add = [t.strip() for t in add_t.split(",")] if add_t.strip() else None
+            rem = [t.strip() for t in rem_t.split(",")] if rem_t.strip() else None
+            jobs.submit_tags(ids, add_tags=add, remove_tags=rem)
+        jobs_panel(["tags"])
+
+    # Duplicates
+    with st.expander("Possible duplicates"):
+        d1,d2 = st.columns([3,1])
+        min_score = d1.slider("Minimum similarity", 0.5, 1.0, dedupe.MIN_SCORE, 0.05)
+        if d2.button("Find duplicates"):
+            jobs.submit_dedupe(min(min_score, dedupe.MIN_SCORE))
+        dups = list_duplicates(min_score, limit=200)
+        if dups:
+            st.dataframe([{
+                "Score": round(d["score"], 2), "ID": d["a"], "Name": d["ca_full_name"], "Phone": d["ca_phone_number"],
+                "Email": d["ca_email_address"], "Other ID": d["b"], "Other Name": d["cb_full_name"],
+                "Other Phone": d["cb_phone_number"], "Other Email": d["cb_email_address"],
+            } for d in dups], use_container_width=True, hide_index=True)
+            pairs = count_duplicates(min_score)
+            st.caption(f"Pairs at this similarity: {pairs:,}. Merging keeps the most complete contact of each group, "
+                       f"fills its blank fields from the others and combines their tags.")
+            if st.button("Merge duplicates", type="primary"):
+                jobs.submit_merge(min_score)
+        else:
+            st.caption("No duplicates found (yet) at this similarity.")
+        jobs_panel(["dedupe", "merge"])
@@ -0,0 +1,49 @@
+# views/dashboard.py
+import streamlit as st
+
+from db import group_counts, total_contacts, fetch_columns, follow_up_counts, FOLLOW_UP_FILTER
+from views.common import df_from_columns, to_human
+
+def render():
+    st.title("Dashboard")
+    counts = group_counts(["lead_temperature","communication_status","registration_status"])
+
+    total = total_contacts()
+    lt_counts = counts["lead_temperature"]
+    cs_counts = counts["communication_status"]
+    rs_counts = counts["registration_status"]
+
+    c1,c2,c3,c4 = st.columns(4)
+    c1.metric("Total Contacts", total)
+    c2.metric("Hot", lt_counts.get("Hot",0))
+    c3.metric("Warm", lt_counts.get("Warm",0))
+    c4.metric("Cold", lt_counts.get("Cold",0))
+
+    r1,r2,r3 = st.columns(3)
+    r1.metric("Activated", rs_counts.get("Activated",0))
+    r2.metric("Registered", rs_counts.get("Registered",0))
+    r3.metric("Not Registered", rs_counts.get("Not Registered",0))
+
+    s1,s2,s3,s4 = st.columns(4)
+    s1.metric("New", cs_counts.get("New",0))
+    s2.metric("In Progress", cs_counts.get("In Progress",0))
+    s3.metric("Pending", cs_counts.get("Pending",0))
+    s4.metric("Completed", cs_counts.get("Completed",0))
+
+    st.markdown("#### Follow-ups")
+    fu = follow_up_counts()
+    f1,f2,f3 = st.columns(3)
+    f1.metric("Overdue", fu["overdue"])
+    f2.metric("Due today", fu["today"])
+    f3.metric("Next 7 days", fu["upcoming"])
+    if fu["overdue"] or fu["today"]:
+        # same query as db.next_actions("due"), fetched as columns
+        cols = ["full_name","phone_number","next_action","action_taken","assigned_to","communication_status"]
+        due = df_from_columns(fetch_columns({FOLLOW_UP_FILTER: "due"}, limit=25, sort_by="next_action_day", descending=False,
+            columns=cols))
+        st.dataframe(to_human(due[cols]), use_container_width=True, hide_index=True)
+
+    st.markdown("#### Recent Contacts")
+    cols = ["full_name","phone_number","date_captured","lead_temperature","registration_status","communication_status"]
+    data = df_from_columns(fetch_columns(limit=25, columns=cols))
+    st.dataframe(to_human(data[cols]), use_container_width=True)
@@ -0,0 +1,19 @@
+# views/help.py
+import streamlit as st
+
+def render():
+    st.title("Help")
+    st.markdown("""
+**What’s included**
+- 20 columns + Tags (Date, Country, Province, City, Lead Temperature, Communication Status, Registration Status, etc.)
+- Global search (token-based) across name, phone, email, sponsor, APL Go ID, location, interest, tags
+- Add New Contact form
+- Inline editing & bulk tags
+- Import / Export with mapping UI (re-imports merge into existing contacts by APL Go ID or phone)
+- Saved segments (create and apply in Contacts)
+- Duplicate finder with merge (Contacts → Possible duplicates)
+
+**Next ideas**
+- Saved KPI links to auto-apply filters
+- Multi-user auth (Supabase) and cloud sync
+""")
@@ -0,0 +1,63 @@
+# views/import_export.py
+import streamlit as st
+
+import jobs
+from importer import read_preview
+from exporter import available_formats
+from db import COLUMNS, UPSERT_POLICIES, load_segments, segment_counts, change_head
+from views.common import jobs_panel
+
+def render():
+    st.title("Import / Export")
+    st.subheader("Import Contacts")
+    up = st.file_uploader("Upload CSV/XLSX", type=["csv","xlsx","xls"])
+    if up is not None:
+        df_in = read_preview(up)
+
+        # mapping UI (try best guess by label)
+        st.caption("Step 1: Map your headers to CRM fields")
+        mapping = {}
+        for k,lbl in COLUMNS:
+            options = [""] + list(df_in.columns)
+            guess = ""
+            if lbl in df_in.columns:
+                guess = lbl
+            else:
+                for c in df_in.columns:
+                    if c.lower().replace(" ","_") == k:
+                        guess = c
+                        break
+            mapping[lbl] = st.selectbox(lbl, options, index=(options.index(guess) if guess in options else 0))
+
+        st.caption("Step 2: Preview first 10 rows")
+        st.dataframe(df_in, use_container_width=True)
+
+        policy = st.radio("Existing contacts (matched by APL Go ID or phone)", UPSERT_POLICIES, horizontal=True,
+                          format_func={"overwrite": "Overwrite with file values", "fill_blanks": "Only fill blank fields",
+                                       "skip": "Skip"}.get)
+        if st.button("Import Now", type="primary"):
+            jobs.submit_import(up, mapping, policy=policy)
+
+    st.divider()
+    st.subheader("Export Contacts")
+    e1,e2 = st.columns(2)
+    segs = load_segments()
+    seg_counts = segment_counts()
+    seg = e1.selectbox("Contacts", [""] + list(segs.keys()),
+                       format_func=lambda n: f"{n} ({seg_counts.get(n, 0):,})" if n else "All contacts")
+    fmt = e2.selectbox("Format", available_formats(), format_func={"csv": "CSV", "csv.gz": "CSV (gzip)",
+                       "xlsx": "Excel (XLSX)", "parquet": "Parquet"}.get)
+    if st.button("Prepare export"):
+        jobs.submit_export(fmt, filters=segs.get(seg), label=f"Export {seg or 'all contacts'} ({fmt})")
+
+    with st.expander("Changes only (delta export)"):
+        st.caption(f"Latest change: #{change_head():,}. Exports every contact added, edited or deleted after "
+                   "the given change number, once, with its current values; use the number shown on the "
+                   "finished job as the starting point next time.")
+        since = st.number_input("Changes after #", min_value=0, step=1)
+        if st.button("Prepare changes export"):
+            jobs.submit_changes_export(fmt, since)
+
+    st.divider()
+    st.subheader("Jobs")
+    jobs_panel(["import", "export"])
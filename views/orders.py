@@ -0,0 +1,6 @@
+# views/orders.py
+import streamlit as st
+
+def render():
+    st.title("Orders")
+    st.info("Orders module placeholder.")
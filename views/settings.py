@@ -0,0 +1,16 @@
+# views/settings.py
+import streamlit as st
+
+from db import load_segments, explain
+
+def render():
+    st.title("Settings")
+    st.info("Viewer/Editor roles and auth can be added in v3.2.")
+
+    with st.expander("Developer: query plans for saved segments"):
+        segs = load_segments()
+        if not segs:
+            st.caption("No segments saved yet.")
+        for name, seg_filters in segs.items():
+            st.markdown(f"**{name}**")
+            st.code("\n".join(explain(seg_filters, limit=50)), language="text")
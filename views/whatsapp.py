@@ -0,0 +1,6 @@
+# views/whatsapp.py
+import streamlit as st
+
+def render():
+    st.title("WhatsApp Tools")
+    st.info("Select a contact in Contacts and use your template in a future version.")